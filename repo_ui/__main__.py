@@ -9,6 +9,7 @@ from .loader import load_repo
 from .mirror_builder import build_mirrors
 from .css_index_builder import build_css_index  # <-- ADD
 from .layer3_pass1 import build_layer3_pass1
+from .layer3_features_v2 import build_global_const_index
 
 
 def _make_run_id() -> str:
@@ -25,7 +26,8 @@ def _write_run_stamp(repo_root: Path, run_id: str, summary: dict) -> None:
         "repo_root": repo_root.as_posix(),
         "summary": summary,
     }
-    p.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    with p.open("w", encoding="utf-8") as fp:
+        json.dump(payload, fp, ensure_ascii=False, indent=2)
 
 
 def main() -> None:
@@ -50,7 +52,8 @@ def main() -> None:
     print(f"[repo_ui] css index finished  rules={css_index.get('rules_count')}")
 
     # Phase 3: layer3 pass1 tiles (reads from mirrors)
-    build_layer3_pass1(repo_root)
+    # Constants of loaded modules, for v2 import-follow id resolution (parsed lazily, once per module)
+    build_layer3_pass1(repo_root, const_index=build_global_const_index(files_cache))
     print("[repo_ui] layer3 pass1 finished  wrote shadow_ui/layer3")
 
     summary = {
@@ -1,11 +1,34 @@
 # repo_ui/css_index_builder.py
 from __future__ import annotations
 
+import ast
+import bisect
+import gzip
+import hashlib
 import json
+import os
 import re
+import sys
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, DefaultDict, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    # Optional: C encoder. With OPT_INDENT_2 its output is byte-identical to
+    # json.dumps(..., ensure_ascii=False, indent=2) for our (str/int/list/dict) payloads.
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None  # type: ignore[assignment]
+
+
+SCAN_CACHE_NAME = ".css_index_cache.json"
+SCAN_CACHE_CONTRACT = "css_scan_cache_v1"  # bump when scan output shape/semantics change
+
+# Below this many uncached docs, process-pool startup costs more than the scan itself.
+PARALLEL_SCAN_MIN_DOCS = 8
 
 
 def build_css_index(
@@ -14,6 +37,9 @@ def build_css_index(
     mirror_cache: Dict[str, Dict[str, Any]],
     run_id: str,
     out_name: str = "css_index.json",
+    cache_name: str = SCAN_CACHE_NAME,
+    include_declarations: bool = False,
+    compress: bool = False,
 ) -> Dict[str, Any]:
     """
     Build a deterministic CSS index from Layer4 mirror_cache.
@@ -23,20 +49,25 @@ def build_css_index(
       2) Inline DEFAULT_CSS blocks extracted from entries with kind=="py" (mirrored py snippets)
 
     Output is written next to mirror at:
-      repo_root/shadow_ui/layer4/mirror/<out_name>
+      repo_root/shadow_ui/layer4/mirror/<out_name>      (<out_name>.gz when compress=True, gzip level 3)
+
+    Per-doc scan results are cached next to it (<cache_name>), keyed by a hash of the doc text.
 
     The index contains:
-      - rules[] (ground truth)
+      - rules[] (ground truth); declarations_text only with include_declarations=True,
+        otherwise declarations_len (nothing downstream reads rule bodies)
       - id_index: {id: [rule_ref...]}
       - class_index: {class: [rule_ref...]}
       - buckets for parse / extraction issues
 
+    In the returned dict, rules / index entries are _Rule / _RuleRef records; on disk they are plain objects.
+
     IMPORTANT:
       - "not used" is not computed here (query/report joins Layer3 ids later).
       - We only extract #id / .class tokens from selector regions that own a { ... } rule block.
     """
     mirror_root = repo_root / "shadow_ui" / "layer4" / "mirror"
-    out_path = mirror_root / out_name
+    out_path = mirror_root / (f"{out_name}.gz" if compress else out_name)
 
     docs: List[_CssDoc] = []
     buckets: Dict[str, List[Dict[str, Any]]] = {
@@ -45,31 +76,52 @@ def build_css_index(
         "py_default_css_present_but_unextracted": [],
     }
 
+    # Scan results are content-addressed (doc text hash), so unchanged docs replay from the cache
+    # instead of being rescanned. Cached rules carry no doc identity and use doc-relative lines.
+    cache_path = mirror_root / cache_name
+    scan_cache = _load_scan_cache(cache_path)
+
+    # Docs only keep their text key; the text of a cache miss is held here until it is scanned.
+    misses: Dict[str, str] = {}
+
+    def text_key(doc_text: str) -> str:
+        key = _doc_text_key(doc_text)
+        if key not in scan_cache and key not in misses:
+            misses[key] = doc_text
+        return key
 
-    # 1) Collect .tcss docs (verbatim)
+    # 1+2) Collect docs in one pass over mirror_cache (order is fixed by the sort below):
+    #   - kind=="tcss": verbatim .tcss content
+    #   - kind=="py":   DEFAULT_CSS blocks from mirrored .py content
     for entry in mirror_cache.values():
-        if entry.get("kind") != "tcss":
+        kind = entry.get("kind")
+        if kind != "tcss" and kind != "py":
             continue
-        docs.append(
-            _CssDoc(
-                doc_id=f"tcss:{entry.get('source_rel','')}",
-                source_kind="tcss_file",
-                source_rel=str(entry.get("source_rel", "")),
-                mirror_rel=str(entry.get("mirror_rel", "")),
-                text=str(entry.get("content", "") or ""),
-                base_line=1,
+
+        text = str(entry.get("content", "") or "")
+        # Interned: these repeat on every rule and index ref of the doc
+        src_rel = sys.intern(str(entry.get("source_rel", "")))
+        mirror_rel = sys.intern(str(entry.get("mirror_rel", "")))
+
+        if kind == "tcss":
+            docs.append(
+                _CssDoc(
+                    doc_id=sys.intern(f"tcss:{src_rel}"),
+                    source_kind="tcss_file",
+                    source_rel=src_rel,
+                    mirror_rel=mirror_rel,
+                    text_key=text_key(text),
+                    base_line=1,
+                )
             )
-        )
+            continue
 
-    # 2) Collect DEFAULT_CSS docs from mirrored .py content
-    for entry in mirror_cache.values():
-        if entry.get("kind") != "py":
+        # No DEFAULT_CSS token: nothing to extract and nothing to flag
+        if "DEFAULT_CSS" not in text:
             continue
-        py_text = str(entry.get("content", "") or "")
-        src_rel = str(entry.get("source_rel", ""))
-        mirror_rel = str(entry.get("mirror_rel", ""))
+
         try:
-            blocks = list(extract_default_css_blocks(py_text))
+            blocks = list(extract_default_css_blocks(text))
         except Exception as e:
             buckets["py_default_css_unextractable"].append(
                 {"source_rel": src_rel, "mirror_rel": mirror_rel, "error": repr(e)}
@@ -77,7 +129,7 @@ def build_css_index(
             continue
 
         # Flag DEFAULT_CSS presence we couldn't extract (non-literal/dynamic/etc.)
-        if ("DEFAULT_CSS" in py_text) and (len(blocks) == 0):
+        if ("DEFAULT_CSS" in text) and (len(blocks) == 0):
             buckets["py_default_css_present_but_unextracted"].append(
                 {"source_rel": src_rel, "mirror_rel": mirror_rel}
             )
@@ -85,11 +137,11 @@ def build_css_index(
         for b in blocks:
             docs.append(
                 _CssDoc(
-                    doc_id=f"py_default_css:{src_rel}:{b.name_hint}",
+                    doc_id=sys.intern(f"py_default_css:{src_rel}:{b.name_hint}"),
                     source_kind="py_default_css",
                     source_rel=src_rel,
                     mirror_rel=mirror_rel,
-                    text=b.text,
+                    text_key=text_key(b.text),
                     # where the CSS string starts in the mirrored content
                     base_line=b.start_line,
                 )
@@ -98,68 +150,78 @@ def build_css_index(
     # Make ordering deterministic for stable rule_i across runs
     docs.sort(key=lambda d: (d.source_kind, d.source_rel, d.doc_id))
 
-    # 3) Scan each doc into rules
-    rules: List[Dict[str, Any]] = []
+    # 3) Scan cache misses (independent of each other; across processes when there are enough),
+    # then drop their texts.
+    scan_cache.update(_scan_docs(misses))
+    misses.clear()
+
+    # 4) Stream rules out of each doc's scan result, building the indices as rules are appended.
+    next_cache: Dict[str, Dict[str, Any]] = {}
+    rules: List[Union[_Rule, _RuleNoDecl]] = []
+    id_index: DefaultDict[str, List[_RuleRef]] = defaultdict(list)
+    class_index: DefaultDict[str, List[_RuleRef]] = defaultdict(list)
+    rule_cls = _Rule if include_declarations else _RuleNoDecl
+
     for doc in docs:
-        try:
-            for rr in scan_rules(doc.text):
-                selector_text_raw = rr.selector_text
-                selector_text = _COMMENT_RE.sub(" ", selector_text_raw).strip()
-
-                # Extract tokens from selector region ONLY (cleaned; declarations never scanned)
-                ids = sorted(set(extract_id_tokens(selector_text)))
-                classes = sorted(set(extract_class_tokens(selector_text)))
-
-                loc = _loc_from_offsets(
-                    text=doc.text,
-                    start_offset=rr.block_start,
-                    end_offset=rr.block_end,
-                    base_line=doc.base_line,
-                )
+        key = doc.text_key
+        scanned = scan_cache[key]
+        next_cache[key] = scanned
+
+        line_shift = doc.base_line - 1
+        for sr in scanned["rules"]:
+            loc_rel = sr["loc"]
+            decl = sr["declarations_text"]
+            decl_field = {"declarations_text": decl} if include_declarations else {"declarations_len": len(decl)}
+            r = rule_cls(
+                doc_id=doc.doc_id,
+                source_kind=doc.source_kind,
+                source_rel=doc.source_rel,
+                mirror_rel=doc.mirror_rel,
+                selector_text=sr["selector_text"],
+                selector_text_raw=sr["selector_text_raw"],
+                **decl_field,
+                loc={
+                    "start_line": loc_rel["start_line"] + line_shift,
+                    "end_line": loc_rel["end_line"] + line_shift,
+                },
+                # cache / worker results arrive as fresh strings; intern so index keys share them
+                ids=[sys.intern(t) for t in sr["ids"]],
+                classes=[sys.intern(t) for t in sr["classes"]],
+            )
+            rule_i = len(rules)
+            rules.append(r)
 
-                rules.append(
-                    {
-                        "doc_id": doc.doc_id,
-                        "source_kind": doc.source_kind,
-                        "source_rel": doc.source_rel,
-                        "mirror_rel": doc.mirror_rel,
-                        "selector_text": selector_text,
-                        "selector_text_raw": selector_text_raw,
-                        "declarations_text": rr.declarations_text,
-                        "loc": loc,
-                        "ids": ids,
-                        "classes": classes,
-                    }
-                )
-        except Exception as e:
+            r_ids = r.ids
+            r_classes = r.classes
+            if not r_ids and not r_classes:
+                continue
+            ref = _RuleRef(
+                rule_i=rule_i,
+                doc_id=r.doc_id,
+                source_kind=r.source_kind,
+                source_rel=r.source_rel,
+                mirror_rel=r.mirror_rel,
+                loc=r.loc,
+                selector_text=r.selector_text,
+            )
+            for id_ in r_ids:
+                id_index[id_].append(ref)
+            for cls in r_classes:
+                class_index[cls].append(ref)
+
+        if scanned.get("error") is not None:
             buckets["css_parse_error"].append(
                 {
                     "doc_id": doc.doc_id,
                     "source_kind": doc.source_kind,
                     "source_rel": doc.source_rel,
                     "mirror_rel": doc.mirror_rel,
-                    "error": repr(e),
+                    "error": scanned["error"],
                 }
             )
 
-    # 4) Build indices
-    id_index: Dict[str, List[Dict[str, Any]]] = {}
-    class_index: Dict[str, List[Dict[str, Any]]] = {}
-
-    for i, r in enumerate(rules):
-        ref = {
-            "rule_i": i,
-            "doc_id": r["doc_id"],
-            "source_kind": r["source_kind"],
-            "source_rel": r["source_rel"],
-            "mirror_rel": r["mirror_rel"],
-            "loc": r["loc"],
-            "selector_text": r["selector_text"],
-        }
-        for id_ in r.get("ids") or []:
-            id_index.setdefault(id_, []).append(ref)
-        for cls in r.get("classes") or []:
-            class_index.setdefault(cls, []).append(ref)
+    # Only keep entries for docs seen this run so the cache does not grow without bound.
+    _write_scan_cache(cache_path, next_cache)
 
     out: Dict[str, Any] = {
         "kind": "css_index",
@@ -177,16 +239,157 @@ def build_css_index(
 
         "rules_count": len(rules),
         "rules": rules,
-        "id_index": id_index,
-        "class_index": class_index,
+        "id_index": dict(id_index),
+        "class_index": dict(class_index),
         "buckets": buckets,
     }
 
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
+    _dump_json(out_path, out, compress=compress)
     return out
 
 
+# ----------------------------
+# Per-doc scan + content-addressed cache
+# ----------------------------
+
+def _doc_text_key(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8", errors="replace"), digest_size=16).hexdigest()
+
+
+def _scan_doc(text: str) -> Dict[str, Any]:
+    """
+    Scan one CSS doc into identity-free rule records (lines relative to the doc, base_line=1).
+
+    Returns {"rules": [...], "error": repr(exc) | None}. Rules scanned before an error are kept,
+    matching the historical behaviour of appending rules as they are found.
+    """
+    rules: List[Dict[str, Any]] = []
+    error = None
+    # Without a '{' there are no rules to locate
+    newlines = _newline_offsets(text) if "{" in text else []
+    try:
+        for rr in scan_rules(text):
+            selector_text_raw = rr.selector_text
+            selector_text = _COMMENT_RE.sub(" ", selector_text_raw).strip()
+
+            # Extract tokens from selector region ONLY (cleaned; declarations never scanned)
+            id_tokens, class_tokens = extract_selector_tokens(selector_text)
+            ids = sorted(set(id_tokens)) if id_tokens else []
+            classes = sorted(set(class_tokens)) if class_tokens else []
+
+            loc = _loc_from_offsets(
+                newlines=newlines,
+                start_offset=rr.block_start,
+                end_offset=rr.block_end,
+                base_line=1,
+            )
+
+            rules.append(
+                {
+                    "selector_text": selector_text,
+                    "selector_text_raw": selector_text_raw,
+                    "declarations_text": rr.declarations_text,
+                    "loc": loc,
+                    "ids": ids,
+                    "classes": classes,
+                }
+            )
+    except Exception as e:
+        error = repr(e)
+    return {"rules": rules, "error": error}
+
+
+def _scan_docs(texts: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Scan {key: text} into {key: _scan_doc(text)}.
+    Uses a process pool for PARALLEL_SCAN_MIN_DOCS or more docs; serial otherwise,
+    or when a pool cannot be started here.
+    """
+    keys = list(texts.keys())
+    if len(keys) >= PARALLEL_SCAN_MIN_DOCS:
+        workers = os.cpu_count() or 1
+        chunksize = max(1, len(keys) // (4 * workers))
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                results = list(ex.map(_scan_doc, [texts[k] for k in keys], chunksize=chunksize))
+            return dict(zip(keys, results))
+        except (OSError, BrokenProcessPool):
+            pass
+    return {k: _scan_doc(texts[k]) for k in keys}
+
+
+def _load_scan_cache(path: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Best-effort load; a missing, corrupt, or stale-contract cache is treated as empty.
+    """
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("contract_version") != SCAN_CACHE_CONTRACT:
+        return {}
+    docs = data.get("docs")
+    return docs if isinstance(docs, dict) else {}
+
+
+def _dump_json(path: Path, payload: Dict[str, Any], *, compress: bool = False) -> None:
+    """
+    Write pretty JSON straight to disk (no intermediate copy of the whole document).
+    _Rule/_RuleRef records serialize as objects in field order.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if orjson is not None:
+        with (gzip.open(path, "wb", compresslevel=3) if compress else path.open("wb")) as fp:
+            for chunk in _iter_orjson_chunks(payload):
+                fp.write(chunk)
+        return
+    if compress:
+        fp_cm = gzip.open(path, "wt", encoding="utf-8", compresslevel=3)
+    else:
+        fp_cm = path.open("w", encoding="utf-8")
+    with fp_cm as fp:
+        json.dump(payload, fp, ensure_ascii=False, indent=2, default=_slots_to_dict)
+
+
+def _iter_orjson_chunks(value: Any, depth: int = 2, pad: bytes = b"\n") -> Iterator[bytes]:
+    """
+    orjson.dumps(value, option=OPT_INDENT_2), one element per chunk for the top `depth` container
+    levels, so peak memory is one index entry / rule rather than the document. pad is the newline
+    plus indentation value is nested at; encoded JSON has raw newlines only between tokens, so
+    re-indenting each piece keeps the output byte-identical to a single dumps call.
+    """
+    if depth == 0 or not isinstance(value, (dict, list)) or not value:
+        yield orjson.dumps(value, option=orjson.OPT_INDENT_2).replace(b"\n", pad)
+        return
+    inner = pad + b"  "
+    if isinstance(value, dict):
+        sep, close = b"{" + inner, pad + b"}"
+        for k, v in value.items():
+            yield sep + orjson.dumps(k) + b": "
+            yield from _iter_orjson_chunks(v, depth - 1, inner)
+            sep = b"," + inner
+    else:
+        sep, close = b"[" + inner, pad + b"]"
+        for v in value:
+            yield sep
+            yield from _iter_orjson_chunks(v, depth - 1, inner)
+            sep = b"," + inner
+    yield close
+
+
+def _slots_to_dict(o: Any) -> Dict[str, Any]:
+    slots = getattr(type(o), "__slots__", None)
+    if slots is None:
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+    return {name: getattr(o, name) for name in slots}
+
+
+def _write_scan_cache(path: Path, docs: Dict[str, Dict[str, Any]]) -> None:
+    payload = {"contract_version": SCAN_CACHE_CONTRACT, "docs": docs}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+
+
 # ----------------------------
 # Data structures
 # ----------------------------
@@ -197,10 +400,51 @@ class _CssDoc:
     source_kind: str  # "tcss_file" | "py_default_css"
     source_rel: str
     mirror_rel: str
-    text: str
+    text_key: str  # _doc_text_key(text); the text itself is not retained
     base_line: int  # 1-based line number in the mirrored file where this doc's text starts
 
 
+@dataclass(slots=True)
+class _Rule:
+    doc_id: str
+    source_kind: str
+    source_rel: str
+    mirror_rel: str
+    selector_text: str
+    selector_text_raw: str
+    declarations_text: str
+    loc: Dict[str, int]  # lines in the mirrored file
+    ids: List[str]
+    classes: List[str]
+
+
+@dataclass(slots=True)
+class _RuleNoDecl:
+    # _Rule without the rule body (default output); same key order with declarations_len in its place
+    doc_id: str
+    source_kind: str
+    source_rel: str
+    mirror_rel: str
+    selector_text: str
+    selector_text_raw: str
+    declarations_len: int
+    loc: Dict[str, int]
+    ids: List[str]
+    classes: List[str]
+
+
+@dataclass(slots=True)
+class _RuleRef:
+    # id_index / class_index entry pointing back at rules[rule_i]
+    rule_i: int
+    doc_id: str
+    source_kind: str
+    source_rel: str
+    mirror_rel: str
+    loc: Dict[str, int]
+    selector_text: str
+
+
 @dataclass(frozen=True)
 class _DefaultCssBlock:
     text: str
@@ -228,11 +472,109 @@ _DEFAULT_CSS_RE = re.compile(
     re.DOTALL,
 )
 
+_STR_PREFIX_RE = re.compile(r'[A-Za-z]*("""|\'\'\'|"|\')')
+
+
 def extract_default_css_blocks(py_text: str) -> Iterable[_DefaultCssBlock]:
     """
-    Extract literal triple-quoted DEFAULT_CSS blocks.
+    Extract literal DEFAULT_CSS blocks.
+    Uses the AST when the mirrored text parses; falls back to the triple-quote regex otherwise.
     Dynamic construction is intentionally not guessed.
     """
+    if "DEFAULT_CSS" not in py_text:
+        return []
+    return list(_extract_default_css_cached(py_text))
+
+
+# Memo for _extract_default_css_cached, keyed by a blake2b digest of the mirror text (never the text itself)
+_DEFAULT_CSS_CACHE: "OrderedDict[bytes, Tuple[_DefaultCssBlock, ...]]" = OrderedDict()
+_DEFAULT_CSS_CACHE_MAX = 4096
+
+
+def _extract_default_css_cached(py_text: str) -> Tuple[_DefaultCssBlock, ...]:
+    # Identical mirrored content is parsed once per process; only the digest and the blocks are kept.
+    key = hashlib.blake2b(py_text.encode("utf-8", errors="replace"), digest_size=8).digest()
+    blocks = _DEFAULT_CSS_CACHE.get(key)
+    if blocks is not None:
+        _DEFAULT_CSS_CACHE.move_to_end(key)
+        return blocks
+    try:
+        blocks = tuple(extract_default_css_blocks_ast(py_text))
+    except (SyntaxError, ValueError):
+        blocks = tuple(_extract_default_css_blocks_re(py_text))
+    _DEFAULT_CSS_CACHE[key] = blocks
+    if len(_DEFAULT_CSS_CACHE) > _DEFAULT_CSS_CACHE_MAX:
+        _DEFAULT_CSS_CACHE.popitem(last=False)
+    return blocks
+
+
+def extract_default_css_blocks_ast(py_text: str) -> List[_DefaultCssBlock]:
+    """
+    Find `DEFAULT_CSS = "..."` / `DEFAULT_CSS: ClassVar[str] = "..."` assignments whose value is a str constant.
+    Raises SyntaxError/ValueError if py_text does not parse.
+    """
+    tree = ast.parse(py_text)
+
+    values: List[ast.Constant] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets = [node.target]
+        else:
+            continue
+        if not any(_is_default_css_target(t) for t in targets):
+            continue
+        v = node.value
+        if isinstance(v, ast.Constant) and isinstance(v.value, str):
+            values.append(v)
+
+    # Source order, so rule_i stays stable for files with several blocks
+    values.sort(key=lambda v: (v.lineno, v.col_offset))
+
+    blocks: List[_DefaultCssBlock] = []
+    for v in values:
+        body = _raw_string_body(py_text, v)
+        if body is None:
+            # implicit concatenation / escaped quotes: take the evaluated value
+            body = v.value
+        start_line = v.lineno
+        end_line = start_line + body.count("\n")
+        blocks.append(_DefaultCssBlock(text=body, start_line=start_line, end_line=end_line))
+    return blocks
+
+
+def _is_default_css_target(target: ast.expr) -> bool:
+    if isinstance(target, ast.Name):
+        return target.id == "DEFAULT_CSS"
+    if isinstance(target, ast.Attribute):
+        return target.attr == "DEFAULT_CSS"
+    return False
+
+
+def _raw_string_body(py_text: str, node: ast.Constant) -> str | None:
+    """
+    Text between the quotes exactly as written in the mirror, so rule lines map back to mirror lines
+    (the evaluated value drops backslash-newlines and resolves escapes).
+    None when the literal is not a single plainly-quoted string.
+    """
+    seg = ast.get_source_segment(py_text, node)
+    if not seg:
+        return None
+    m = _STR_PREFIX_RE.match(seg)
+    if not m:
+        return None
+    q = m.group(1)
+    body = seg[m.end():]
+    if len(body) < len(q) or not body.endswith(q):
+        return None
+    body = body[: len(body) - len(q)]
+    if q in body:
+        return None
+    return body
+
+
+def _extract_default_css_blocks_re(py_text: str) -> Iterable[_DefaultCssBlock]:
     for m in _DEFAULT_CSS_RE.finditer(py_text):
         body = m.group("body") or ""
         start_line = py_text.count("\n", 0, m.start("body")) + 1
@@ -244,146 +586,71 @@ def extract_default_css_blocks(py_text: str) -> Iterable[_DefaultCssBlock]:
 # TCSS rule scanner (brace-depth, comment + string aware)
 # ----------------------------
 
-def scan_rules(text: str) -> Iterable[_RuleSpan]:
-    n = len(text)
-    i = 0
-    depth = 0
-    in_comment = False
-    in_string: Optional[str] = None  # "'" or '"'
-    last_rule_end = 0
+# One alternation for everything the scanner cares about; runs of plain characters are skipped by the
+# regex engine instead of one Python iteration per char.
+# The trailing bare "/*" and quote alternatives only match when the terminated forms above them fail,
+# i.e. they mark an unterminated comment / string literal.
+_SCAN_TOKENS = re.compile(
+    r"/\*[\s\S]*?\*/"
+    r"|\"(?:\\[\s\S]|[^\"\\])*\""
+    r"|'(?:\\[\s\S]|[^'\\])*'"
+    r"|[{}]"
+    r"|/\*|[\"']"
+)
 
-    while i < n:
-        ch = text[i]
-        nxt = text[i + 1] if i + 1 < n else ""
+# Fallback token -> error message (a single dict probe instead of a comparison ladder per token)
+_UNTERMINATED_TOKENS: Dict[str, str] = {
+    "/*": "unterminated /* comment */",
+    '"': "unterminated string literal",
+    "'": "unterminated string literal",
+}
 
-        # comment start
-        if not in_string and not in_comment and ch == "/" and nxt == "*":
-            in_comment = True
-            i += 2
-            continue
 
-        # comment end
-        if in_comment:
-            if ch == "*" and nxt == "/":
-                in_comment = False
-                i += 2
-            else:
-                i += 1
-            continue
+def scan_rules(text: str) -> Iterable[_RuleSpan]:
+    # Fast path: no braces and nothing that could be left unterminated -> no rules, no error
+    if "{" not in text and "}" not in text and "/*" not in text and '"' not in text and "'" not in text:
+        return
 
-        # string start/end
-        if not in_string and ch in ("'", '"'):
-            in_string = ch
-            i += 1
-            continue
-        if in_string:
-            if ch == "\\":
-                i += 2
-                continue
-            if ch == in_string:
-                in_string = None
-                i += 1
-                continue
-            i += 1
-            continue
+    depth = 0
+    last_rule_end = 0
+    block_start = 0
+
+    for m in _SCAN_TOKENS.finditer(text):
+        tok = m.group()
+        ch = tok[0]
 
-        # braces (only when not in comment/string)
         if ch == "{":
             if depth == 0:
-                sel_start = last_rule_end
-                sel_end = i
-                block_start = i
-                block_end = _find_matching_brace(text, i)
-
-                decl_start = i + 1
-                decl_end = block_end
-
-                yield _RuleSpan(
-                    selector_text=text[sel_start:sel_end],
-                    declarations_text=text[decl_start:decl_end],
-                    sel_start=sel_start,
-                    sel_end=sel_end,
-                    block_start=block_start,
-                    block_end=block_end + 1,  # end exclusive
-                )
-
-                last_rule_end = block_end + 1
-                i = block_end + 1
-                continue
-            else:
-                depth += 1
-                i += 1
-                continue
+                block_start = m.start()
+            depth += 1
+            continue
 
         if ch == "}":
             if depth == 0:
                 raise ValueError("unmatched '}' at top level")
             depth -= 1
-            i += 1
-            continue
-
-        i += 1
-
-    if in_comment:
-        raise ValueError("unterminated /* comment */")
-    if in_string:
-        raise ValueError("unterminated string literal")
-    if depth != 0:
-        raise ValueError("unbalanced braces")
-
-
-def _find_matching_brace(text: str, open_i: int) -> int:
-    n = len(text)
-    i = open_i + 1
-    depth = 1
-    in_comment = False
-    in_string: Optional[str] = None
-
-    while i < n:
-        ch = text[i]
-        nxt = text[i + 1] if i + 1 < n else ""
-
-        if not in_string and not in_comment and ch == "/" and nxt == "*":
-            in_comment = True
-            i += 2
-            continue
-        if in_comment:
-            if ch == "*" and nxt == "/":
-                in_comment = False
-                i += 2
-            else:
-                i += 1
-            continue
-
-        if not in_string and ch in ("'", '"'):
-            in_string = ch
-            i += 1
-            continue
-        if in_string:
-            if ch == "\\":
-                i += 2
-                continue
-            if ch == in_string:
-                in_string = None
-                i += 1
-                continue
-            i += 1
-            continue
-
-        if ch == "{":
-            depth += 1
-            i += 1
-            continue
-        if ch == "}":
-            depth -= 1
             if depth == 0:
-                return i
-            i += 1
+                block_end = m.end()  # end exclusive
+                yield _RuleSpan(
+                    selector_text=text[last_rule_end:block_start],
+                    declarations_text=text[block_start + 1 : block_end - 1],
+                    sel_start=last_rule_end,
+                    sel_end=block_start,
+                    block_start=block_start,
+                    block_end=block_end,
+                )
+                last_rule_end = block_end
             continue
 
-        i += 1
+        # Terminated comments / strings are skipped whole; only the fallback forms are in the table.
+        msg = _UNTERMINATED_TOKENS.get(tok)
+        if msg is not None:
+            if depth != 0:
+                raise ValueError("unterminated '{' block")
+            raise ValueError(msg)
 
-    raise ValueError("unterminated '{' block")
+    if depth != 0:
+        raise ValueError("unterminated '{' block")
 
 
 # ----------------------------
@@ -395,51 +662,49 @@ _COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
 
 _IDENT_RE = re.compile(r"[A-Za-z0-9_-]+")
 
-def extract_id_tokens(selector_text: str) -> List[str]:
-    out: List[str] = []
-    i = 0
-    n = len(selector_text)
-    while i < n:
-        if selector_text[i] != "#":
-            i += 1
-            continue
-        m = _IDENT_RE.match(selector_text, i + 1)
-        if m:
-            out.append(m.group(0))
-            i = m.end()
-        else:
-            i += 1
-    return out
+# "#ident" / ".ident" in one pass; group(1) says which.
+_ID_OR_CLASS_RE = re.compile(r"([#.])(" + _IDENT_RE.pattern + r")")
 
-def extract_class_tokens(selector_text: str) -> List[str]:
-    out: List[str] = []
-    i = 0
-    n = len(selector_text)
-    while i < n:
-        if selector_text[i] != ".":
-            i += 1
-            continue
-        m = _IDENT_RE.match(selector_text, i + 1)
-        if m:
-            out.append(m.group(0))
-            i = m.end()
+def extract_selector_tokens(selector_text: str) -> Tuple[List[str], List[str]]:
+    """
+    Returns (id_tokens, class_tokens) in selector order (duplicates kept).
+    """
+    ids: List[str] = []
+    classes: List[str] = []
+    # Tag-only selectors (`Screen > Vertical`, `Button`, `*`) are the common case
+    if "#" not in selector_text and "." not in selector_text:
+        return ids, classes
+    for m in _ID_OR_CLASS_RE.finditer(selector_text):
+        if m.group(1) == "#":
+            ids.append(sys.intern(m.group(2)))
         else:
-            i += 1
-    return out
+            classes.append(sys.intern(m.group(2)))
+    return ids, classes
 
 
 # ----------------------------
 # Loc helpers
 # ----------------------------
 
-def _loc_from_offsets(*, text: str, start_offset: int, end_offset: int, base_line: int) -> Dict[str, int]:
+_NEWLINE_RE = re.compile(r"\n")
+
+
+def _newline_offsets(text: str) -> List[int]:
+    """
+    Sorted offsets of every "\n" in text; built once per doc and shared by all its rules.
+    """
+    return [m.start() for m in _NEWLINE_RE.finditer(text)]
+
+
+def _loc_from_offsets(*, newlines: List[int], start_offset: int, end_offset: int, base_line: int) -> Dict[str, int]:
     if start_offset < 0:
         start_offset = 0
     if end_offset < start_offset:
         end_offset = start_offset
 
-    start_line_rel = text.count("\n", 0, start_offset) + 1
-    end_line_rel = text.count("\n", 0, max(end_offset - 1, 0)) + 1 if text else 1
+    # bisect_left == number of newlines strictly before the offset (same as text.count("\n", 0, off))
+    start_line_rel = bisect.bisect_left(newlines, start_offset) + 1
+    end_line_rel = bisect.bisect_left(newlines, max(end_offset - 1, 0)) + 1
 
     return {
         "start_line": base_line + (start_line_rel - 1),
@@ -0,0 +1,217 @@
+# repo_ui/layer3_aggregates.py
+"""
+Layer3 aggregates: per-tile histograms shared by the pipeline (writer) and repo_ui.query (reader).
+
+- shadow_ui/layer3/aggregates.json       snapshot: totals + per_tile contributions (owned by repo_ui.query)
+- shadow_ui/layer3/aggregates.wal.jsonl  append-only deltas, one JSON object per line
+
+layer3_pass1 appends an "upsert" line per tile it writes (the contribution plus the written file's
+mtime_ns/size), so repo_ui.query can fold new tiles in without parsing them. The reader replays the
+log over the snapshot and compacts (snapshot rewrite + truncate) once it grows past WAL_COMPACT_AT;
+the writer does the same after its append, so runs without a query in between keep the log bounded.
+The log is an accelerator only: the reader still checks every tile's stat, so lost or stale lines
+just mean a re-parse.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+AGGREGATES_REL = Path("shadow_ui/layer3/aggregates.json")
+AGGREGATES_WAL_REL = Path("shadow_ui/layer3/aggregates.wal.jsonl")
+AGGREGATES_CONTRACT = "repo_ui_aggregates_v1"  # bump when a per-tile entry changes shape
+AGGREGATE_KEYS = ("types", "literal_ids", "ids", "hashes", "edge_cases")
+
+# Log lines before they are folded into the snapshot and the log truncated (by reader or writer)
+WAL_COMPACT_AT = 20
+
+
+def tile_contribution(tile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    One tile's histograms, counted exactly as the tile-scanning query verbs count them:
+      types: constructor nodes per non-empty type
+      literal_ids: nodes with a literal id, per non-empty type
+      ids: literal id value -> occurrences (any type; the value may be "")
+      hashes: layout_hash -> roots
+      edge_cases: bucket kind -> count
+    """
+    types: Dict[str, int] = {}
+    literal_ids: Dict[str, int] = {}
+    ids: Dict[str, int] = {}
+    nodes = ((tile.get("pools") or {}).get("constructors") or {}).get("nodes") or []
+    for n in nodes:
+        if not isinstance(n, dict):
+            continue
+        t = str(n.get("type") or "")
+        id_obj = n.get("id") or {}
+        is_literal = isinstance(id_obj, dict) and id_obj.get("kind") == "literal"
+        if is_literal:
+            idv = str(id_obj.get("value") or "")
+            ids[idv] = ids.get(idv, 0) + 1
+        if not t:
+            continue
+        types[t] = types.get(t, 0) + 1
+        if is_literal:
+            literal_ids[t] = literal_ids.get(t, 0) + 1
+
+    hashes: Dict[str, int] = {}
+    for it in ((tile.get("pools") or {}).get("hashes") or {}).get("items") or []:
+        if isinstance(it, dict) and it.get("layout_hash"):
+            h = str(it["layout_hash"])
+            hashes[h] = hashes.get(h, 0) + 1
+
+    edge_cases: Dict[str, int] = {}
+    for b in (tile.get("edge_cases") or {}).get("buckets") or []:
+        if isinstance(b, dict) and b.get("kind"):
+            k = str(b["kind"])
+            try:
+                c = int(b.get("count") or 0)
+            except (TypeError, ValueError):
+                c = 0
+            edge_cases[k] = edge_cases.get(k, 0) + c
+
+    src = str((tile.get("source") or {}).get("source_rel", "") or "")
+    return {
+        "source_rel": src.replace("\\", "/").lstrip("./"),
+        "types": types,
+        "literal_ids": literal_ids,
+        "ids": ids,
+        "hashes": hashes,
+        "edge_cases": edge_cases,
+    }
+
+
+def fold_contribution(totals: Dict[str, Dict[str, int]], contrib: Dict[str, Any], sign: int) -> None:
+    # sign=+1 adds a tile's histograms into totals, -1 takes them back out (zero counts are dropped)
+    for key in AGGREGATE_KEYS:
+        dst = totals.setdefault(key, {})
+        for k, c in (contrib.get(key) or {}).items():
+            v = dst.get(k, 0) + sign * int(c)
+            if v:
+                dst[k] = v
+            else:
+                dst.pop(k, None)
+
+
+def append_wal(repo_root: Path, entries: List[Dict[str, Any]]) -> None:
+    """
+    Append log lines (each {"contract_version", "op", "tile_rel", ...}) in one write.
+    Best-effort: without the log the reader re-parses the changed tiles instead.
+    """
+    if not entries:
+        return
+    path = repo_root / AGGREGATES_WAL_REL
+    data = "".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in entries)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as fp:
+            fp.write(data)
+    except OSError:
+        pass
+
+
+def read_wal(repo_root: Path) -> List[Dict[str, Any]]:
+    """
+    Log lines of the current contract, in append order; a torn or foreign line is skipped.
+    """
+    try:
+        text = (repo_root / AGGREGATES_WAL_REL).read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return []
+    out: List[Dict[str, Any]] = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            e = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(e, dict) and e.get("contract_version") == AGGREGATES_CONTRACT and e.get("tile_rel"):
+            out.append(e)
+    return out
+
+
+def truncate_wal(repo_root: Path) -> None:
+    try:
+        os.remove(repo_root / AGGREGATES_WAL_REL)
+    except OSError:
+        pass
+
+
+def replay_wal(
+    totals: Dict[str, Dict[str, int]],
+    per_tile: Dict[str, Any],
+    wal: List[Dict[str, Any]],
+    racy_after: Optional[int] = None,
+) -> None:
+    """
+    Apply log lines to a snapshot's totals/per_tile in place: each line replaces the tile's previous
+    contribution. Entries with mtime_ns >= racy_after get mtime_ns=-1 so the reader re-checks them.
+    """
+    for e in wal:
+        rel = str(e["tile_rel"])
+        old = per_tile.pop(rel, None)
+        if isinstance(old, dict):
+            fold_contribution(totals, old, -1)
+        if e.get("op") != "upsert":
+            continue
+        contrib: Dict[str, Any] = {key: dict(e.get(key) or {}) for key in AGGREGATE_KEYS}
+        contrib["source_rel"] = str(e.get("source_rel") or "")
+        try:
+            mtime_ns = int(e.get("mtime_ns"))
+        except (TypeError, ValueError):
+            mtime_ns = -1
+        contrib["mtime_ns"] = -1 if racy_after is not None and mtime_ns >= racy_after else mtime_ns
+        contrib["size"] = e.get("size")
+        fold_contribution(totals, contrib, +1)
+        per_tile[rel] = contrib
+
+
+def write_snapshot(repo_root: Path, payload: Dict[str, Any]) -> bool:
+    # tmp + rename; False when the snapshot could not be written (the log must then be kept)
+    path = repo_root / AGGREGATES_REL
+    tmp = path.with_name(path.name + ".tmp")
+    payload["generated_at"] = datetime.now().isoformat(timespec="seconds")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        return False
+    return True
+
+
+def compact_wal_if_large(repo_root: Path) -> None:
+    """
+    Writer-side compaction: once the log holds more than WAL_COMPACT_AT lines, fold it into the
+    snapshot and truncate it. Tiles the log doesn't mention keep their snapshot entries; the reader's
+    stat check still catches anything else that changed.
+
+    The writer's own stats are trusted as-is (no racy window): every later rewrite by the pipeline
+    logs a fresh line, and marking just-written tiles -1 would make the next query re-parse them all.
+    """
+    wal = read_wal(repo_root)
+    if len(wal) <= WAL_COMPACT_AT:
+        return
+    try:
+        snap = json.loads((repo_root / AGGREGATES_REL).read_text(encoding="utf-8", errors="replace"))
+    except (OSError, ValueError):
+        snap = {}
+    if not isinstance(snap, dict) or snap.get("contract_version") != AGGREGATES_CONTRACT:
+        snap = {}
+    totals: Dict[str, Dict[str, int]] = {key: dict((snap.get("totals") or {}).get(key) or {}) for key in AGGREGATE_KEYS}
+    per_tile: Dict[str, Any] = dict(snap.get("per_tile") or {})
+    replay_wal(totals, per_tile, wal)
+    payload = {
+        "contract_version": AGGREGATES_CONTRACT,
+        "generated_at": None,
+        "totals": totals,
+        "per_tile": per_tile,
+    }
+    # Snapshot first, then drop the log it now contains (a crash in between only replays idempotent upserts)
+    if write_snapshot(repo_root, payload):
+        truncate_wal(repo_root)
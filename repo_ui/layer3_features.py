@@ -13,6 +13,7 @@ v1 features:
 
 You integrate these by calling the apply_* functions from layer3_pass1 AFTER your baseline pass1 edges are built,
 and then passing the returned exclusion sets into your residue bucketing.
+Call `collect_feature_candidates(tree)` once and pass it to each apply_* so the tree is traversed a single time.
 """
 
 from __future__ import annotations
@@ -60,30 +61,54 @@ class FeatureResult:
     notes: List[str]
 
 
+@dataclass
+class FeatureCandidates:
+    """
+    Nodes the v1 features inspect, gathered in one traversal and shared by all features.
+    """
+    with_nodes: List[ast.With]
+    mount_calls: List[ast.Call]
+
+
 # -----------------------------
 # Helpers
 # -----------------------------
 
-def _call_key(call: ast.Call) -> Tuple[int, int, int, int]:
-    ln = int(getattr(call, "lineno", 0) or 0)
-    col = int(getattr(call, "col_offset", 0) or 0)
-    eln = int(getattr(call, "end_lineno", ln) or ln)
-    ecol = int(getattr(call, "end_col_offset", col) or col)
-    return (ln, col, eln, ecol)
+# AST node classes are never subclassed by the parser, so `type(x) is T` is an exact (and cheaper)
+# replacement for isinstance on these hot paths.
+_Attribute = ast.Attribute
+_Call = ast.Call
+_Expr = ast.Expr
+_With = ast.With
+_Yield = ast.Yield
 
 
-def _iter_top_level_stmts(mod: ast.Module) -> Sequence[ast.stmt]:
-    return list(getattr(mod, "body", []) or [])
+class _FeatureCollector(ast.NodeVisitor):
+    def __init__(self) -> None:
+        self.with_nodes: List[ast.With] = []
+        self.mount_calls: List[ast.Call] = []
+
+    def visit_With(self, node: ast.With) -> None:
+        self.with_nodes.append(node)
+        self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if type(node.func) is _Attribute and node.func.attr == "mount":
+            self.mount_calls.append(node)
+        self.generic_visit(node)
 
 
-def _yield_value_from_stmt(stmt: ast.stmt) -> Optional[ast.AST]:
-    # Common AST shape: Expr(value=Yield(value=...))
-    if isinstance(stmt, ast.Expr) and isinstance(getattr(stmt, "value", None), ast.Yield):
-        return stmt.value.value
-    # Rare: standalone Yield node
-    if isinstance(stmt, ast.Yield):
-        return getattr(stmt, "value", None)
-    return None
+def collect_feature_candidates(tree: ast.AST) -> FeatureCandidates:
+    """
+    Single tree walk collecting every `with` statement and every `<expr>.mount(...)` call.
+    """
+    collector = _FeatureCollector()
+    collector.visit(tree)
+    return FeatureCandidates(with_nodes=collector.with_nodes, mount_calls=collector.mount_calls)
+
+
+def _iter_top_level_stmts(mod: ast.Module) -> Sequence[ast.stmt]:
+    return list(getattr(mod, "body", []) or [])
 
 
 # -----------------------------
@@ -94,14 +119,14 @@ def apply_with_edges_v1(
     *,
     tree: ast.Module,
     ui_syms: Set[str],
-    call_to_node_id: Dict[Tuple[int, int, int, int], str],
+    call_to_node_id: Dict[int, str],
     edges: List[Any],
-    children_map: Dict[str, List[str]],
     nodes: Dict[str, Any],
     mirror_text: str,
     meta_refs: Dict[str, Any],
     edge_ctor: Callable[..., Any],
     hooks: FeatureHooks,
+    candidates: Optional[FeatureCandidates] = None,
 ) -> FeatureResult:
     """
     Model containment via:
@@ -118,6 +143,8 @@ def apply_with_edges_v1(
       even if we cannot resolve any child constructor calls.
     - We still emit child edges for resolvable children.
     - We report diagnostics in notes so you can see what's missing.
+
+    Child ids are appended to the parent record's `children` list, alongside the edge.
     """
     modeled_with_nodes: Set[int] = set()
     notes: List[str] = []
@@ -135,12 +162,15 @@ def apply_with_edges_v1(
     with_child_calls_unresolved = 0
     child_edges_added = 0
 
-    for w in (n for n in ast.walk(tree) if isinstance(n, ast.With)):
+    if candidates is None:
+        candidates = collect_feature_candidates(tree)
+
+    for w in candidates.with_nodes:
         # find the first UI constructor in with-items
         parent_call: Optional[ast.Call] = None
         for item in w.items:
             ce = item.context_expr
-            if isinstance(ce, ast.Call) and hooks.is_ui_constructor_call(ce, ui_syms):
+            if type(ce) is _Call and hooks.is_ui_constructor_call(ce, ui_syms):
                 parent_call = ce
                 break
         if parent_call is None:
@@ -148,7 +178,7 @@ def apply_with_edges_v1(
 
         with_candidates += 1
 
-        parent_id = call_to_node_id.get(_call_key(parent_call))
+        parent_id = call_to_node_id.get(id(parent_call))
         if not parent_id:
             # it's a UI constructor syntactically, but we couldn't map it to a node_id
             # (should be rare; keep it in residue by not excluding)
@@ -174,17 +204,20 @@ def apply_with_edges_v1(
         # collect children in immediate with-body (strict, conservative)
         child_calls: List[Tuple[int, ast.Call]] = []
         for stmt in (w.body or []):
-            # yield Child(...)
-            yv = _yield_value_from_stmt(stmt)
-            if isinstance(yv, ast.Call) and hooks.is_ui_constructor_call(yv, ui_syms):
-                child_calls.append((int(getattr(stmt, "lineno", 10**9) or 10**9), yv))
+            stmt_type = type(stmt)
+
+            # yield Child(...)  -- Expr(value=Yield(value=...)); a bare Yield is never a statement
+            if stmt_type is _Expr and type(stmt.value) is _Yield:
+                yv = stmt.value.value
+                if type(yv) is _Call and hooks.is_ui_constructor_call(yv, ui_syms):
+                    child_calls.append((int(getattr(stmt, "lineno", 10**9) or 10**9), yv))
 
             # nested with NestedParent(...)
-            if isinstance(stmt, ast.With):
+            elif stmt_type is _With:
                 nested_parent: Optional[ast.Call] = None
                 for it in stmt.items:
                     ce2 = it.context_expr
-                    if isinstance(ce2, ast.Call) and hooks.is_ui_constructor_call(ce2, ui_syms):
+                    if type(ce2) is _Call and hooks.is_ui_constructor_call(ce2, ui_syms):
                         nested_parent = ce2
                         break
                 if nested_parent is not None:
@@ -200,7 +233,7 @@ def apply_with_edges_v1(
         any_resolved_child = False
 
         for _ln, ccall in child_calls:
-            child_id = call_to_node_id.get(_call_key(ccall))
+            child_id = call_to_node_id.get(id(ccall))
             if not child_id:
                 continue
 
@@ -217,7 +250,7 @@ def apply_with_edges_v1(
                         focus=focus,
                     )
                 )
-                children_map[parent_id].append(child_id)
+                nodes[parent_id].children.append(child_id)
                 existing.add(tup)
                 child_edges_added += 1
 
@@ -248,13 +281,14 @@ def apply_mount_edges_v1(
     *,
     tree: ast.Module,
     ui_syms: Set[str],
-    call_to_node_id: Dict[Tuple[int, int, int, int], str],
+    call_to_node_id: Dict[int, str],
     edges: List[Any],
     mirror_text: str,
     meta_refs: Dict[str, Any],
     edge_ctor: Callable[..., Any],
     hooks: FeatureHooks,
     edge_kind_field: str = "edge_kind",
+    candidates: Optional[FeatureCandidates] = None,
 ) -> FeatureResult:
     """
     Model `.mount(<UIConstructor>(...))` as explicit edges.
@@ -271,21 +305,21 @@ def apply_mount_edges_v1(
     exclude_calls: Set[int] = set()
     notes: List[str] = []
 
-    # Best-effort: include minimal provenance for each mount call.
-    for c in (n for n in ast.walk(tree) if isinstance(n, ast.Call) and isinstance(n.func, ast.Attribute)):
-        if c.func.attr != "mount":
-            continue
+    if candidates is None:
+        candidates = collect_feature_candidates(tree)
 
+    # Best-effort: include minimal provenance for each mount call.
+    for c in candidates.mount_calls:
         # Find first argument that is UI constructor call
         child_call: Optional[ast.Call] = None
         for a in list(c.args or []):
-            if isinstance(a, ast.Call) and hooks.is_ui_constructor_call(a, ui_syms):
+            if type(a) is _Call and hooks.is_ui_constructor_call(a, ui_syms):
                 child_call = a
                 break
         if child_call is None:
             continue
 
-        child_id = call_to_node_id.get(_call_key(child_call))
+        child_id = call_to_node_id.get(id(child_call))
         if not child_id:
             continue
 
@@ -2,8 +2,34 @@
 from __future__ import annotations
 
 import ast
-from dataclasses import replace
-from typing import Any, Dict, List, Optional, Tuple
+import re
+import sys
+from collections import ChainMap, deque
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+# Parser-produced nodes are never subclass instances and literal values are plain str, so exact
+# `type(x) is T` checks match isinstance here at a fraction of the cost.
+_Constant = ast.Constant
+_FormattedValue = ast.FormattedValue
+_ImportFrom = ast.ImportFrom
+_JoinedStr = ast.JoinedStr
+_Module = ast.Module
+_Name = ast.Name
+
+# Names and short literal values recur across files (one constant imported from many sites);
+# interned copies share storage and make dict lookups / equality checks pointer-fast.
+_INTERN_MAX_LEN = 256
+
+
+# Module names after "from" (leading dots dropped, as _collect_from_imports looks modules up by name).
+# A textual superset is enough: it only picks which tables ConstIndex.precomputed() fills.
+_FROM_IMPORT_RE = re.compile(r"^[ \t]*from[ \t]+\.*([A-Za-z_][\w.]*)[ \t]+import\b", re.M)
+
+
+def _intern(s: str) -> str:
+    return sys.intern(s) if len(s) < _INTERN_MAX_LEN else s
 
 
 def _collect_string_constants(tree: ast.AST) -> Dict[str, str]:
@@ -16,37 +42,161 @@ def _collect_string_constants(tree: ast.AST) -> Dict[str, str]:
       - Only string literals
       - Includes module-level and class-body assignments present in the mirror
     """
-    out: Dict[str, str] = {}
-
-    def visit_body(body: List[ast.stmt]) -> None:
-        for st in body:
-            if isinstance(st, ast.Assign):
-                if isinstance(st.value, ast.Constant) and isinstance(st.value.value, str):
-                    for t in st.targets:
-                        if isinstance(t, ast.Name):
-                            out.setdefault(t.id, st.value.value)
-            elif isinstance(st, ast.AnnAssign):
-                if (
-                    isinstance(st.target, ast.Name)
-                    and st.value is not None
-                    and isinstance(st.value, ast.Constant)
-                    and isinstance(st.value.value, str)
-                ):
-                    out.setdefault(st.target.id, st.value.value)
-            elif isinstance(st, ast.ClassDef):
-                visit_body(st.body)
-
-    if isinstance(tree, ast.Module):
-        visit_body(tree.body)
-
-    return out
-
-
-def _extract_id_expr(call: ast.Call) -> Optional[ast.AST]:
-    for kw in call.keywords or []:
-        if kw.arg == "id":
-            return kw.value
-    return None
+    if type(tree) is not _Module:
+        return {}
+    collector = _StringConstCollector()
+    collector.visit(tree)
+    return collector.out
+
+
+class _StringConstCollector(ast.NodeVisitor):
+    """
+    Per-node-type dispatch (NodeVisitor's cached visit_<Type> lookup) instead of a type-check ladder.
+    Only Module and ClassDef bodies are entered; every other statement (def, if, try, ...) is skipped
+    whole, because generic_visit does nothing here.
+    """
+
+    def __init__(self) -> None:
+        self.out: Dict[str, str] = {}
+
+    def generic_visit(self, node: ast.AST) -> None:
+        return None
+
+    def visit_Module(self, node: ast.Module) -> None:
+        for st in node.body:
+            self.visit(st)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        for st in node.body:
+            self.visit(st)
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        if type(node.value) is _Constant and type(node.value.value) is str:
+            for t in node.targets:
+                if type(t) is _Name:
+                    self.out.setdefault(sys.intern(t.id), _intern(node.value.value))
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
+        if (
+            type(node.target) is _Name
+            and node.value is not None
+            and type(node.value) is _Constant
+            and type(node.value.value) is str
+        ):
+            self.out.setdefault(sys.intern(node.target.id), _intern(node.value.value))
+
+
+@lru_cache(maxsize=None)
+def _module_string_constants(path: str, mtime_ns: int, size: int) -> Dict[str, str]:
+    """
+    String constants of an imported module file, parsed once per (path, mtime_ns, size) per process.
+    A shared constants module imported by many files is parsed once, not once per importer.
+    Empty if the file can't be read or parsed. Callers must not mutate the result.
+    """
+    try:
+        with open(path, encoding="utf-8", errors="replace") as fp:
+            mod_ast = ast.parse(fp.read())
+    except Exception:
+        return {}
+    return _collect_string_constants(mod_ast)
+
+
+class ConstIndex:
+    """
+    Project-wide {rel_path: {name: literal}} over sources the loader already decoded.
+    A module's table is computed on first lookup and kept, so each module is parsed at most once
+    per run and never re-read from disk.
+    Also maps dotted module names to rel paths (pkg/__init__.py -> "pkg"), so import-follow is a
+    dict lookup rather than a filesystem probe per from-import.
+    """
+
+    def __init__(self, texts: Dict[str, str]) -> None:
+        self._texts = texts
+        self._consts: Dict[str, Dict[str, str]] = {}
+        self._modules: Dict[str, str] = {}
+        for rel_path in texts:
+            mod = rel_path[:-3].replace("/", ".")
+            if mod.endswith(".__init__"):
+                # a package shadows a same-named sibling module, as in the import system
+                self._modules[mod[: -len(".__init__")]] = rel_path
+            elif mod != "__init__":
+                self._modules.setdefault(mod, rel_path)
+
+    def __contains__(self, rel_path: str) -> bool:
+        return rel_path in self._texts
+
+    def get(self, rel_path: str) -> Optional[Dict[str, str]]:
+        consts = self._consts.get(rel_path)
+        if consts is not None:
+            return consts
+        text = self._texts.get(rel_path)
+        if text is None:
+            return None
+        try:
+            consts = _collect_string_constants(ast.parse(text))
+        except Exception:
+            consts = {}
+        self._consts[rel_path] = consts
+        return consts
+
+    def get_module(self, mod: str) -> Optional[Dict[str, str]]:
+        rel_path = self._modules.get(mod)
+        if rel_path is None:
+            return None
+        return self.get(rel_path)
+
+    def precomputed(self) -> "ConstIndex":
+        """
+        A text-free copy for process-pool workers: the tables of every indexed module some indexed
+        source from-imports, computed here once, plus the module map. Workers then neither receive
+        the source texts nor parse a shared module once each; a module without a table falls back
+        to disk like one the loader never collected.
+        """
+        imported: Set[str] = set()
+        for text in self._texts.values():
+            imported.update(_FROM_IMPORT_RE.findall(text))
+        out = ConstIndex({})
+        out._modules = dict(self._modules)
+        for mod in sorted(imported):
+            rel_path = self._modules.get(mod)
+            if rel_path is not None:
+                consts = self.get(rel_path)
+                if consts is not None:
+                    out._consts[rel_path] = consts
+        return out
+
+
+def build_global_const_index(files_cache: List[Dict[str, Any]]) -> ConstIndex:
+    """
+    Index loader output (.py entries, keyed by posix rel_path) for import-follow constant lookups.
+    """
+    texts: Dict[str, str] = {}
+    for f in files_cache:
+        if f.get("ext") != ".py":
+            continue
+        texts[f["rel_path"].as_posix()] = str(f.get("text", "") or "")
+    return ConstIndex(texts)
+
+
+# Fields holding statement lists (or handler / match-case lists that hold them), in ast `_fields` order.
+_STMT_LIST_FIELDS = ("body", "handlers", "orelse", "finalbody", "cases")
+
+
+def _iter_statements(tree: ast.AST) -> Iterable[ast.AST]:
+    """
+    Breadth-first over statements only (plus the except-handler / match-case nodes between them).
+    Same relative order as ast.walk for statement nodes, without visiting any expression.
+    Nested statements are kept on purpose: mirrors only carry textual top-level imports, so the
+    from-imports worth following usually live inside method bodies.
+    """
+    queue = deque([tree])
+    while queue:
+        node = queue.popleft()
+        yield node
+        for field in _STMT_LIST_FIELDS:
+            children = getattr(node, field, None)
+            if children:
+                queue.extend(children)
 
 
 def _render_fstring_pattern(expr: ast.JoinedStr) -> Optional[str]:
@@ -58,37 +208,40 @@ def _render_fstring_pattern(expr: ast.JoinedStr) -> Optional[str]:
       - FormattedValue parts become "{<name>}" if Name, "{?}" otherwise
       - If the f-string contains format specs we can’t represent, return None
     """
+    values = expr.values
+    if not values:
+        return ""
     parts: List[str] = []
-    for v in expr.values:
-        if isinstance(v, ast.Constant) and isinstance(v.value, str):
+    for v in values:
+        tv = type(v)
+        if tv is _Constant:
+            if type(v.value) is not str:
+                return None
             parts.append(v.value)
-            continue
-        if isinstance(v, ast.FormattedValue):
+        elif tv is _FormattedValue:
             # If there is a format_spec, it’s still a pattern, but can be complex.
             # Keep conservative: accept only empty / None format_spec.
             if v.format_spec is not None:
                 return None
             inner = v.value
-            if isinstance(inner, ast.Name):
-                parts.append("{" + inner.id + "}")
-            else:
-                parts.append("{?}")
-            continue
-        # Unknown component in f-string
-        return None
+            parts.append(f"{{{inner.id}}}" if type(inner) is _Name else "{?}")
+        else:
+            # Unknown component in f-string
+            return None
 
     return "".join(parts)
 
 def apply_feature_v2_id_resolution(
     *,
     tree: ast.AST,
-    nodes: Dict[str, Any],  # NodeRec-like objects
-    node_calls: Dict[str, ast.Call],
+    nodes: Dict[str, Any],  # NodeRec-like objects (mutable; id_kind / id_value are updated in place)
+    node_calls: Dict[str, ast.Call],  # id= expressions are read from NodeRec.id_expr
     edge_case_counts: Dict[str, int],
     edge_case_samples: List[Dict[str, Any]],
     verbose: bool,
     file_rel: str,
     repo_root,  # pathlib.Path, passed from pass1
+    const_index: Optional[ConstIndex] = None,
 ) -> Dict[str, int]:
     """
     v2.1: Post-pass ID enrichment:
@@ -96,13 +249,24 @@ def apply_feature_v2_id_resolution(
           * in the same file, OR
           * imported via 'from mod import NAME' where mod resolves to a local .py file
             and that file has NAME = "literal"
+          (looked up in const_index, package __init__ included; read from disk when it has no entry)
       - Convert simple f-strings into id patterns (id.kind='pattern')
       - Recompute id_nonliteral bucket accordingly, and add id_pattern bucket
     """
     import pathlib
 
+    # Fast path: the constant tables (this file's walk + import follow) only serve id=NAME, so build
+    # them only when some still-dynamic id actually is a bare Name. Most files have none.
+    needs_consts = False
+    for nid, n in nodes.items():
+        if getattr(n, "id_kind", None) != "dynamic":
+            continue
+        if type(getattr(n, "id_expr", None)) is _Name:
+            needs_consts = True
+            break
+
     # 1) constants in this file
-    const_str = _collect_string_constants(tree)
+    const_str = _collect_string_constants(tree) if needs_consts else {}
 
     # 2) import-follow constants (from-import only; conservative)
     imported_const: Dict[str, str] = {}
@@ -116,13 +280,6 @@ def apply_feature_v2_id_resolution(
         # also allow "tvm_ui.surfaces.pages_surface" mapping within repo root
         return None
 
-    def _parse_file(p: pathlib.Path) -> Optional[ast.Module]:
-        try:
-            txt = p.read_text(encoding="utf-8", errors="replace")
-            return ast.parse(txt)
-        except Exception:
-            return None
-
     def _collect_from_imports(module_ast: ast.AST) -> List[Tuple[str, str]]:
         """
         Returns list of (imported_name, module) for: from module import imported_name
@@ -131,36 +288,39 @@ def apply_feature_v2_id_resolution(
           - aliases (we resolve to asname if present; NAME refers to asname in current file)
         """
         out: List[Tuple[str, str]] = []
-        for n in ast.walk(module_ast):
-            if isinstance(n, ast.ImportFrom) and n.module:
+        for n in _iter_statements(module_ast):
+            if type(n) is _ImportFrom and n.module:
                 mod = n.module
                 for a in n.names or []:
                     if a.name == "*":
                         continue
                     bind = a.asname or a.name
-                    out.append((bind, mod))
+                    out.append((sys.intern(bind), sys.intern(mod)))
         return out
 
     # Build mapping for names imported in THIS file only.
-    for bind, mod in _collect_from_imports(tree):
+    for bind, mod in (_collect_from_imports(tree) if needs_consts else []):
         # If we already resolved in-file, skip.
         if bind in const_str:
             continue
-        p = _module_to_path(mod)
-        if not p:
-            continue
-        mod_ast = _parse_file(p)
-        if not mod_ast:
-            continue
-        mod_consts = _collect_string_constants(mod_ast)
+        # run-wide index first (dict lookup, no stat); modules the loader didn't collect fall back to disk
+        mod_consts = const_index.get_module(mod) if const_index is not None else None
+        if mod_consts is None:
+            p = _module_to_path(mod)
+            if not p:
+                continue
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            mod_consts = _module_string_constants(str(p), st.st_mtime_ns, st.st_size)
         # We imported bind name, but in the source module it might have different original name (if alias used).
         # Conservative: only resolve when alias not used OR module defines the bound name.
         if bind in mod_consts:
             imported_const[bind] = mod_consts[bind]
 
-    # Merge (local wins)
-    resolved_table = dict(imported_const)
-    resolved_table.update(const_str)
+    # Merge (local wins); chained view, no copy of either table
+    resolved_table = ChainMap(const_str, imported_const)
 
     resolved_literal = 0
     pattern_ids = 0
@@ -174,26 +334,26 @@ def apply_feature_v2_id_resolution(
         if getattr(n, "id_kind", None) != "dynamic":
             continue
 
-        call = node_calls.get(nid)
-        if call is None:
-            continue
-
-        id_expr = _extract_id_expr(call)
+        # id= expression is captured by pass1 on the record
+        id_expr = getattr(n, "id_expr", None)
         if id_expr is None:
             continue
 
         # Case A: id = SOME_CONST (local or imported)
-        if isinstance(id_expr, ast.Name) and id_expr.id in resolved_table:
+        if type(id_expr) is _Name and id_expr.id in resolved_table:
             lit = resolved_table[id_expr.id]
-            nodes[nid] = replace(n, id_kind="literal", id_value=lit)
+            # NodeRec is mutable; update in place instead of copying the record
+            n.id_kind = "literal"
+            n.id_value = _intern(lit)
             resolved_literal += 1
             continue
 
         # Case B: id = f"..."
-        if isinstance(id_expr, ast.JoinedStr):
+        if type(id_expr) is _JoinedStr:
             pat = _render_fstring_pattern(id_expr)
             if pat is not None:
-                nodes[nid] = replace(n, id_kind="pattern", id_value=pat)
+                n.id_kind = "pattern"
+                n.id_value = _intern(pat)
                 pattern_ids += 1
                 if len(pattern_samples) < 10:
                     pattern_samples.append(
@@ -221,12 +381,10 @@ def apply_feature_v2_id_resolution(
     nonliteral = 0
     nonliteral_samples: List[Dict[str, Any]] = []
     for nid, ty, prov in remaining_nonliteral_nodes:
-        call = node_calls.get(nid)
-        if call is None:
+        n = nodes[nid]
+        if getattr(n, "id_expr", None) is None:
             continue
-        if _extract_id_expr(call) is None:
-            continue
-        if getattr(nodes[nid], "id_kind", None) != "dynamic":
+        if getattr(n, "id_kind", None) != "dynamic":
             continue
         nonliteral += 1
         if len(nonliteral_samples) < 10:
@@ -250,7 +408,8 @@ def apply_feature_v2_id_resolution(
         print(
             f"[layer3/features] {file_rel}: id_resolution_v2_1: "
             f"resolved_literal={resolved_literal} pattern_ids={pattern_ids} "
-            f"import_const={len(imported_const)} local_const={len(const_str)}"
+            f"import_const={len(imported_const)} "
+            f"local_const={len(const_str) if needs_consts else 'skipped'}"
         )
 
     return {"resolved_literal": resolved_literal, "pattern_ids": pattern_ids}
@@ -2,18 +2,39 @@
 from __future__ import annotations
 
 import ast
+import bisect
+import contextlib
 import hashlib
+import io
 import json
 import os
-from dataclasses import dataclass
+import re
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, DefaultDict, Deque, Dict, FrozenSet, Iterator, List, Optional, Set, Tuple
+from repo_ui.layer3_aggregates import AGGREGATES_CONTRACT, append_wal, compact_wal_if_large, tile_contribution
 from repo_ui.layer3_features import (
+    FeatureCandidates,
     FeatureHooks,
     apply_with_edges_v1,
     apply_mount_edges_v1,
 )
 
+try:
+    from repo_ui.layer3_features_v2 import apply_feature_v2_id_resolution
+except Exception:  # v2 is an optional post-pass; pass-1 tiles are built without it
+    apply_feature_v2_id_resolution = None  # type: ignore[assignment]
+
+try:
+    # Optional: faster meta reads / tile writes; same text as the json calls below for our payloads.
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None  # type: ignore[assignment]
+
 
 # ----------------------------
 # Config (v1)
@@ -29,6 +50,20 @@ MIRROR_ROOT = Path("shadow_ui") / "layer4" / "mirror"
 OUT_TILES_ROOT = Path("shadow_ui") / "layer3" / "tiles"
 OUT_INDEX_PATH = Path("shadow_ui") / "layer3" / "index.json"
 
+# Below this many mirrors, process-pool startup costs more than building the tiles.
+PARALLEL_TILE_MIN_FILES = 8
+
+# Tile batches submitted ahead of the consumer per pool worker; bounds the built tiles held in the parent.
+TILE_BUILD_AHEAD_PER_WORKER = 2
+TILE_BUILD_BATCH_MAX = 8
+
+# Threads encoding + writing tile JSON while the main thread builds / aggregates the next tile
+TILE_WRITE_WORKERS = 4
+
+# Layout hash algorithm; hashes are "<algo>:<hex>". "sha1" keeps hashes comparable with earlier runs;
+# "blake2b20" (blake2b, 20-byte digest) is faster but every layout_hash changes with it.
+LAYOUT_HASH_ALGO = "sha1"
+
 
 # ----------------------------
 # Helpers
@@ -38,43 +73,137 @@ def _sha1_text(text: str) -> str:
     return hashlib.sha1(text.encode("utf-8", errors="replace")).hexdigest()
 
 
+def _layout_hash(canonical: str) -> str:
+    # "<algo>:<hex>" for one canonical layout string (see LAYOUT_HASH_ALGO)
+    data = canonical.encode("utf-8", errors="replace")
+    if LAYOUT_HASH_ALGO == "blake2b20":
+        return "blake2b20:" + hashlib.blake2b(data, digest_size=20).hexdigest()
+    return "sha1:" + hashlib.sha1(data).hexdigest()
+
+
 def _read_json(path: Path) -> Dict[str, Any]:
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
     return json.loads(path.read_text(encoding="utf-8"))
 
 
-def _write_json(path: Path, payload: Dict[str, Any]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+# Output dirs already created by this process; tiles share few dirs, so most writes skip the mkdir.
+_ensured_dirs: Set[str] = set()
 
 
-def _module_matches_prefix(mod: str, prefixes: List[str]) -> bool:
-    for p in prefixes:
-        if mod == p or mod.startswith(p + "."):
-            return True
-    return False
+def _encode_json(payload: Any) -> bytes:
+    if orjson is not None:
+        # NON_STR_KEYS: int-keyed dicts stringify as json.dumps would
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
 
 
-def _escape_id_value_for_canonical(s: str) -> str:
+def _iter_json_chunks(payload: Dict[str, Any]) -> Iterator[bytes]:
     """
-    Canonical escaping for ID values in the layout serialization.
-
-    We only escape characters that would conflict with the serialization grammar:
-      '#', '(', ')', ',', '\\'
-    Using percent-encoding keeps it deterministic and unambiguous.
+    _encode_json(payload) for a str-keyed dict, one top-level member at a time, so peak memory is
+    the largest member's encoding rather than the whole document's. Each member is encoded alone
+    and re-indented one level: encoded JSON has raw newlines only between tokens (never inside
+    strings), so the concatenation is byte-identical to encoding the dict in one call.
     """
-    # Percent-encode only the grammar chars and backslash.
-    # Keep everything else as-is for readability.
-    repl = {
+    if not payload:
+        yield _encode_json(payload)
+        return
+    sep = b"{\n  "
+    for key, value in payload.items():
+        yield sep + _encode_json(key) + b": " + _encode_json(value).replace(b"\n", b"\n  ")
+        sep = b",\n  "
+    yield b"\n}"
+
+
+def _write_json(path: Path, payload: Dict[str, Any]) -> None:
+    parent = str(path.parent)
+    if parent not in _ensured_dirs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _ensured_dirs.add(parent)
+
+    # tmp + rename, so readers never see a half-written tile or index
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        fp = open(tmp, "wb")
+    except FileNotFoundError:
+        # dir removed since it was cached
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fp = open(tmp, "wb")
+    with fp:
+        for chunk in _iter_json_chunks(payload):
+            fp.write(chunk)
+    os.replace(tmp, path)
+
+
+def _prov(
+    anchor_ref: Optional[str],
+    focus: Optional[Dict[str, int]],
+    cache: Optional[Dict[Tuple[Any, ...], Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    # provenance object; "focus" only when there is one.
+    # cache: per-tile (anchor_ref, focus items) -> object, so equal provenance is one shared dict
+    # (tile output is only serialized, never mutated).
+    if cache is not None:
+        key = (anchor_ref, tuple(focus.items()) if focus else None)
+        prov = cache.get(key)
+        if prov is not None:
+            return prov
+    prov = {"anchor_ref": anchor_ref}
+    if focus:
+        prov["focus"] = focus
+    if cache is not None:
+        cache[key] = prov
+    return prov
+
+
+# Shared "id" payloads for the value-less kinds; tile output is write-only, never mutated.
+_ID_NONE: Dict[str, Any] = {"kind": "none"}
+_ID_DYNAMIC: Dict[str, Any] = {"kind": "dynamic"}
+
+
+def _id_payload(kind: str, value: Optional[str]) -> Dict[str, Any]:
+    # "id" object for one node (trees + constructors): value only for literal / pattern ids
+    if value is not None and (kind == "literal" or kind == "pattern"):
+        return {"kind": kind, "value": value}
+    if kind == "none":
+        return _ID_NONE
+    if kind == "dynamic":
+        return _ID_DYNAMIC
+    return {"kind": kind}
+
+
+def _compile_prefixes(prefixes: List[str]) -> Tuple[FrozenSet[str], Tuple[str, ...]]:
+    # (exact module names, "<prefix>." strings) - built once, not per import checked
+    return frozenset(prefixes), tuple(p + "." for p in prefixes)
+
+
+def _module_matches_prefix(mod: str, compiled: Tuple[FrozenSet[str], Tuple[str, ...]]) -> bool:
+    exact, dotted = compiled
+    return mod in exact or mod.startswith(dotted)
+
+
+# Percent-encode only the grammar chars and backslash.
+# Keep everything else as-is for readability.
+_ID_ESCAPE_TABLE = str.maketrans(
+    {
         "\\": "%5C",
         "#": "%23",
         "(": "%28",
         ")": "%29",
         ",": "%2C",
     }
-    out = []
-    for ch in s:
-        out.append(repl.get(ch, ch))
-    return "".join(out)
+)
+
+
+def _escape_id_value_for_canonical(s: str) -> str:
+    """
+    Canonical escaping for ID values in the layout serialization.
+
+    We only escape characters that would conflict with the serialization grammar:
+      '#', '(', ')', ',', '\\'
+    Using percent-encoding keeps it deterministic and unambiguous.
+    """
+    return s.translate(_ID_ESCAPE_TABLE)
 
 
 @dataclass(frozen=True)
@@ -85,11 +214,11 @@ class SnippetAnchor:
     end_line: int
 
 
-def _build_meta_refs(meta: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, SnippetAnchor]]:
+def _build_meta_refs(meta: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, SnippetAnchor], Dict[str, str]]:
     """
     Build:
       - meta_refs JSON object (snippets table)
-      - reverse map from snippet_sha1 -> anchor_ref id and anchor data
+      - reverse maps from snippet_sha1 -> anchor data and snippet_sha1 -> anchor_ref id
 
     Deterministic ordering: by (start_line, end_line, snippet_kind, snippet_sha1)
     """
@@ -112,8 +241,9 @@ def _build_meta_refs(meta: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Sn
 
     meta_refs: Dict[str, Any] = {"snippets": {}}
     by_sha1: Dict[str, SnippetAnchor] = {}
+    sha1_to_ref: Dict[str, str] = {}
     for i, a in enumerate(anchors, start=1):
-        ref = f"s{i:03d}"
+        ref = "s%03d" % i
         meta_refs["snippets"][ref] = {
             "snippet_kind": a.snippet_kind,
             "snippet_sha1": a.snippet_sha1,
@@ -123,56 +253,125 @@ def _build_meta_refs(meta: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Sn
         # If duplicates, keep first deterministically.
         if a.snippet_sha1 and a.snippet_sha1 not in by_sha1:
             by_sha1[a.snippet_sha1] = a
+            sha1_to_ref[a.snippet_sha1] = ref
+
+    return meta_refs, by_sha1, sha1_to_ref
+
+
+# Parser-produced nodes are never subclass instances, so `type(x) is T` matches isinstance here.
+_Attribute = ast.Attribute
+_Call = ast.Call
+_Constant = ast.Constant
+_ImportFrom = ast.ImportFrom
+_Load = ast.Load
+_Name = ast.Name
+_Starred = ast.Starred
+_With = ast.With
+_Yield = ast.Yield
 
-    return meta_refs, by_sha1
 
+@dataclass
+class TreeScan:
+    """
+    Everything pass-1 needs from the mirror AST, gathered in one walk (all lists in ast.walk order).
+    UI symbols are only known once the whole tree is seen, so calls / yields are kept as candidates
+    (Name-called) and narrowed to ui_symbols by the consumers.
+    """
+    imported_names: Set[str]  # bound by ImportFrom of a dialect module
+    used_names: Set[str]  # Name ids in Load context
+    name_calls: List[ast.Call]  # Name(...) calls
+    with_nodes: List[ast.With]
+    mount_calls: List[ast.Call]  # <expr>.mount(...) calls
+    yield_exprs: List[ast.Yield]  # yield Name(...)
 
-def _collect_ui_imported_names(tree: ast.AST, dialect_prefixes: List[str]) -> Set[str]:
+
+def _walk_nodes(tree: ast.AST) -> List[ast.AST]:
     """
-    Collect locally bound names from any ImportFrom whose module matches the dialect prefix.
+    Every node under tree, in exactly ast.walk's (breadth-first, _fields) order.
+    Appending to the list being iterated is the BFS queue; children come straight from _fields
+    instead of one iter_child_nodes generator per node (about 2x faster than ast.walk).
     """
-    names: Set[str] = set()
-    for node in ast.walk(tree):
-        if isinstance(node, ast.ImportFrom):
-            mod = node.module or ""
-            if _module_matches_prefix(mod, dialect_prefixes):
+    _AST = ast.AST
+    nodes: List[ast.AST] = [tree]
+    append = nodes.append
+    for node in nodes:
+        for name in node._fields:
+            v = getattr(node, name, None)
+            if isinstance(v, _AST):
+                append(v)
+            elif type(v) is list:
+                for item in v:
+                    if isinstance(item, _AST):
+                        append(item)
+    return nodes
+
+
+def _scan_tree(tree: ast.AST, dialect_prefixes: List[str]) -> TreeScan:
+    imported: Set[str] = set()
+    used: Set[str] = set()
+    name_calls: List[ast.Call] = []
+    with_nodes: List[ast.With] = []
+    mount_calls: List[ast.Call] = []
+    yield_exprs: List[ast.Yield] = []
+    dialect = _compile_prefixes(dialect_prefixes)
+
+    # most frequent node types first
+    for node in _walk_nodes(tree):
+        t = type(node)
+        if t is _Name:
+            if type(node.ctx) is _Load:
+                used.add(node.id)
+        elif t is _Call:
+            ft = type(node.func)
+            if ft is _Name:
+                name_calls.append(node)
+            elif ft is _Attribute and node.func.attr == "mount":
+                mount_calls.append(node)
+        elif t is _With:
+            with_nodes.append(node)
+        elif t is _ImportFrom:
+            if _module_matches_prefix(node.module or "", dialect):
                 for alias in node.names:
                     if alias.name == "*":
                         continue
-                    names.add(alias.asname or alias.name)
-    return names
-
-
-def _collect_used_name_ids(tree: ast.AST) -> Set[str]:
-    used: Set[str] = set()
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
-            used.add(node.id)
-    return used
+                    imported.add(alias.asname or alias.name)
+        elif t is _Yield:
+            v = node.value
+            if type(v) is _Call and type(v.func) is _Name:
+                yield_exprs.append(node)
+
+    return TreeScan(
+        imported_names=imported,
+        used_names=used,
+        name_calls=name_calls,
+        with_nodes=with_nodes,
+        mount_calls=mount_calls,
+        yield_exprs=yield_exprs,
+    )
 
 
-def _ui_symbols_used(tree: ast.AST, dialect_prefixes: List[str]) -> List[str]:
-    imported = _collect_ui_imported_names(tree, dialect_prefixes)
+def _ui_symbols_used(scan: TreeScan) -> List[str]:
+    imported = scan.imported_names
     if not imported:
         return []
-    used = _collect_used_name_ids(tree)
+    used = scan.used_names
     # "used" per contract: imported AND referenced (Load). Mirrors already bias this.
     return sorted([n for n in imported if n in used])
 
 
 def _is_ui_constructor_call(node: ast.AST, ui_symbols: Set[str]) -> bool:
-    if not isinstance(node, ast.Call):
-        return False
     # v1 strict: only Name(...) where Name is in ui_symbols
-    return isinstance(node.func, ast.Name) and node.func.id in ui_symbols
+    # (pass1's own loops inline this check; the function backs FeatureHooks)
+    return type(node) is _Call and type(node.func) is _Name and node.func.id in ui_symbols
 
 
-def _extract_id_kw(node: ast.Call) -> Tuple[str, Optional[str], Optional[str]]:
+def _extract_id_kw(node: ast.Call) -> Tuple[str, Optional[str], Optional[str], Optional[ast.AST]]:
     """
-    Returns (kind, literal_value, reason)
+    Returns (kind, literal_value, reason, id_expr)
       kind: 'literal' | 'none' | 'dynamic'
       literal_value: only for 'literal'
       reason: for 'dynamic' (e.g., 'non_string_literal')
+      id_expr: the id= value expression (None when there is no id kwarg)
     """
     id_kw = None
     for kw in node.keywords or []:
@@ -181,14 +380,14 @@ def _extract_id_kw(node: ast.Call) -> Tuple[str, Optional[str], Optional[str]]:
             break
 
     if id_kw is None:
-        return ("none", None, None)
+        return ("none", None, None, None)
 
     val = id_kw.value
-    if isinstance(val, ast.Constant) and isinstance(val.value, str):
-        return ("literal", val.value, None)
+    if type(val) is _Constant and type(val.value) is str:
+        return ("literal", val.value, None, val)
 
     # v1: only accept quoted string literals; everything else becomes (dynamic)
-    return ("dynamic", None, "id_nonliteral")
+    return ("dynamic", None, "id_nonliteral", val)
 
 
 def _enclosing_top_level_block(tree: ast.Module, target: ast.AST) -> Optional[ast.AST]:
@@ -220,15 +419,19 @@ def _anchor_ref_for_top_level_node(
     mirror_text: str,
     node: ast.AST,
     meta_refs: Dict[str, Any],
+    sha1_to_ref: Optional[Dict[str, str]] = None,
 ) -> Optional[str]:
     """
     Compute snippet_sha1 for the exact top-level node source segment and match it to meta_refs.
     Returns anchor_ref (e.g., s001) if found.
+    sha1_to_ref (from _build_meta_refs) turns the match into one dict probe.
     """
     seg = ast.get_source_segment(mirror_text, node)
     if not seg:
         return None
     h = _sha1_text(seg)
+    if sha1_to_ref is not None:
+        return sha1_to_ref.get(h)
     # meta_refs["snippets"] has entries keyed by s###
     for ref, rec in (meta_refs.get("snippets") or {}).items():
         if rec.get("snippet_sha1") == h:
@@ -250,13 +453,128 @@ def _anchor_data(meta_refs: Dict[str, Any], anchor_ref: str) -> Optional[Snippet
     except Exception:
         return None
 
+_LINE_BREAK_RE = re.compile(rb"\r\n|\r|\n")
+
+
+class _TopLevelBlocks:
+    """
+    Per-tile memo for the provenance lookups every node / edge / root / sample repeats:
+      - enclosing(tree, target): same result as _enclosing_top_level_block, from a
+        line -> containing top-level nodes table instead of a scan of tree.body
+      - anchor_ref(mirror_text, node, meta_refs): _anchor_ref_for_top_level_node, with the segment
+        sha1 computed once per block
+      - anchor_data(meta_refs, anchor_ref): _anchor_data, built once per ref (meta_refs is the
+        tile's one table)
+    Signatures match the FeatureHooks callables. Memo keys are id(node); nodes outlive the tile build.
+    """
+
+    def __init__(self, tree: ast.Module, sha1_to_ref: Dict[str, str]) -> None:
+        self._sha1_to_ref = sha1_to_ref
+        # mirror_text encoded once + byte offset of each line start (set on first anchor_ref)
+        self._src: Optional[memoryview] = None
+        self._line_starts: List[int] = []
+        self._by_line: Dict[int, List[Tuple[int, int, ast.AST]]] = {}
+        for node in tree.body:
+            n_ln = getattr(node, "lineno", None)
+            n_end = getattr(node, "end_lineno", None)
+            if not isinstance(n_ln, int) or not isinstance(n_end, int):
+                continue
+            entry = (n_ln, n_end, node)
+            for ln in range(n_ln, n_end + 1):
+                self._by_line.setdefault(ln, []).append(entry)
+        self._refs: Dict[int, Optional[str]] = {}
+        self._anchors: Dict[str, Optional[SnippetAnchor]] = {}
+
+    def enclosing(self, tree: ast.Module, target: ast.AST) -> Optional[ast.AST]:
+        t_ln = getattr(target, "lineno", None)
+        t_end = getattr(target, "end_lineno", None)
+        if not isinstance(t_ln, int) or not isinstance(t_end, int):
+            return None
+        best = None
+        best_span = None
+        # entries are in tree.body order, so ties keep the first node, as the full scan does
+        for n_ln, n_end, node in self._by_line.get(t_ln, ()):
+            if t_end <= n_end:
+                span = (n_end - n_ln, n_ln, n_end)
+                if best is None or span < best_span:
+                    best = node
+                    best_span = span
+        return best
+
+    def anchor_data(self, meta_refs: Dict[str, Any], anchor_ref: str) -> Optional[SnippetAnchor]:
+        try:
+            return self._anchors[anchor_ref]
+        except KeyError:
+            anchor = self._anchors[anchor_ref] = _anchor_data(meta_refs, anchor_ref)
+            return anchor
+
+    def anchor_ref(self, mirror_text: str, node: ast.AST, meta_refs: Dict[str, Any]) -> Optional[str]:
+        key = id(node)
+        if key in self._refs:
+            return self._refs[key]
+        h = self._segment_sha1(mirror_text, node)
+        ref = self._sha1_to_ref.get(h) if h is not None else None
+        self._refs[key] = ref
+        return ref
+
+    def _segment_sha1(self, mirror_text: str, node: ast.AST) -> Optional[str]:
+        """
+        _sha1_text(ast.get_source_segment(mirror_text, node)) without re-splitting the whole text per
+        call: AST columns are UTF-8 byte offsets, so the segment is one slice of the encoded text.
+        None where get_source_segment would give None or "".
+        """
+        try:
+            ln, end_ln = node.lineno, node.end_lineno
+            col, end_col = node.col_offset, node.end_col_offset
+        except AttributeError:
+            return None
+        if end_ln is None or end_col is None:
+            return None
+        if self._src is None:
+            self._src = memoryview(mirror_text.encode("utf-8", errors="replace"))
+            # same line breaks as ast.get_source_segment (\r\n, \r, \n; not \f)
+            self._line_starts = [0] + [m.end() for m in _LINE_BREAK_RE.finditer(self._src)]
+        starts = self._line_starts
+        if not (0 < ln <= end_ln <= len(starts)):
+            return None
+        start = starts[ln - 1] + col
+        end = starts[end_ln - 1] + end_col
+        if end <= start:
+            return None
+        return hashlib.sha1(self._src[start:end]).hexdigest()
+
+
+class _LineRanges:
+    """
+    "Which statement of these types in one body covers line ln", for the yield-context lookup.
+    Compound statements in a body never share a line, so their spans are disjoint and in start
+    order: one bisect finds the same node as a first-match scan of the body.
+    """
+
+    __slots__ = ("_starts", "_spans")
+
+    def __init__(self, body: List[ast.stmt], types: Tuple[type, ...]) -> None:
+        self._starts: List[int] = []
+        self._spans: List[Tuple[int, ast.stmt]] = []
+        for node in body:
+            if not isinstance(node, types):
+                continue
+            n_ln = getattr(node, "lineno", None)
+            n_end = getattr(node, "end_lineno", None)
+            if isinstance(n_ln, int) and isinstance(n_end, int):
+                self._starts.append(n_ln)
+                self._spans.append((n_end, node))
+
+    def covering(self, ln: int) -> Optional[ast.stmt]:
+        i = bisect.bisect_right(self._starts, ln) - 1
+        if i >= 0 and ln <= self._spans[i][0]:
+            return self._spans[i][1]
+        return None
+
+
 def _expr_to_compact_text(expr: ast.AST) -> str:
-    try:
-        # py>=3.9
-        return ast.unparse(expr)
-    except Exception:
-        # fallback: stable-ish repr
-        return expr.__class__.__name__
+    # ast.unparse is always there: this module already needs py>=3.10 (dataclass slots=True)
+    return ast.unparse(expr)
 
 def _focus_span_from_block(
     block: ast.AST,
@@ -288,7 +606,7 @@ def _focus_span_from_block(
 # Layout building
 # ----------------------------
 
-@dataclass
+@dataclass(slots=True)
 class NodeRec:
     node_id: str
     type_name: str
@@ -298,18 +616,24 @@ class NodeRec:
     focus: Optional[Dict[str, int]]  # original-source
     # Mirror coords for determinism (fallback)
     mirror_lno: int
+    # id= value expression, kept so feature passes don't rescan call.keywords
+    id_expr: Optional[ast.AST] = None
+    # Ordered child node ids (positional args, then with-body children), filled as edges are added
+    children: List[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class EdgeRec:
     parent: str
     child: str
     order_index: int
     anchor_ref: Optional[str]
     focus: Optional[Dict[str, int]]  # original-source
+    # Stamped by features (e.g. "mount"); a declared slot so their setattr still lands
+    edge_kind: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class RootRec:
     root_id: str
     node_id: str
@@ -318,42 +642,64 @@ class RootRec:
     focus: Optional[Dict[str, int]]  # original-source
 
 
-def _canonical_serialize(node_id: str, nodes: Dict[str, NodeRec], children_map: Dict[str, List[str]]) -> str:
-    n = nodes[node_id]
-    type_name = n.type_name
+def _canonical_head(n: NodeRec) -> str:
+    # "<Type>#<id part>" for one node
     if n.id_kind == "literal" and n.id_value is not None:
         id_part = _escape_id_value_for_canonical(n.id_value)
     elif n.id_kind == "none":
         id_part = "(none)"
     else:
         id_part = "(dynamic)"
+    return f"{n.type_name}#{id_part}"
+
 
-    kids = children_map.get(node_id, [])
-    if not kids:
-        return f"{type_name}#{id_part}()"
-    inner = ",".join(_canonical_serialize(k, nodes, children_map) for k in kids)
-    return f"{type_name}#{id_part}({inner})"
+def _canonical_serialize(
+    node_id: str,
+    nodes: Dict[str, NodeRec],
+    memo: Optional[Dict[str, str]] = None,
+) -> str:
+    """
+    Type#id(child,child,...) for the subtree at node_id.
+    Built bottom-up (iterative post-order, no recursion limit on deep trees): each node's string is
+    its head plus its children's strings, kept in memo by node_id.
+    memo: optional, shared across the roots of a tile so subtrees reachable from several roots
+    are serialized once.
+    """
+    if memo is None:
+        memo = {}
+    done = memo.get(node_id)
+    if done is not None:
+        return done
+    # (node_id, children_done) items: first visit pushes the children, second assembles the node.
+    stack: List[Tuple[str, bool]] = [(node_id, False)]
+    while stack:
+        nid, children_done = stack.pop()
+        if nid in memo:
+            continue
+        kids = nodes[nid].children
+        if not children_done:
+            stack.append((nid, True))
+            for k in reversed(kids):
+                if k not in memo:
+                    stack.append((k, False))
+            continue
+        head = _canonical_head(nodes[nid])
+        if kids:
+            memo[nid] = head + "(" + ",".join([memo[k] for k in kids]) + ")"
+        else:
+            memo[nid] = head + "()"
+    return memo[node_id]
 
 
-def _find_ui_calls(tree: ast.AST, ui_symbols: Set[str]) -> List[ast.Call]:
-    calls: List[ast.Call] = []
-    for node in ast.walk(tree):
-        if _is_ui_constructor_call(node, ui_symbols):
-            calls.append(node)  # type: ignore[arg-type]
-    return calls
+def _find_ui_calls(scan: TreeScan, ui_symbols: Set[str]) -> List[ast.Call]:
+    return [c for c in scan.name_calls if c.func.id in ui_symbols]
 
 
-def _find_yield_roots(tree: ast.AST, ui_symbols: Set[str]) -> List[ast.Yield]:
-    roots: List[ast.Yield] = []
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Yield):
-            v = node.value
-            if isinstance(v, ast.Call) and _is_ui_constructor_call(v, ui_symbols):
-                roots.append(node)
-    return roots
+def _find_yield_roots(scan: TreeScan, ui_symbols: Set[str]) -> List[ast.Yield]:
+    return [y for y in scan.yield_exprs if y.value.func.id in ui_symbols]
 
 def _detect_unmodeled_patterns(
-    tree: ast.AST,
+    scan: TreeScan,
     ui_symbols: Set[str],
     *,
     exclude_with_nodes: Optional[Set[int]] = None,
@@ -376,32 +722,29 @@ def _detect_unmodeled_patterns(
     }
 
     # with <UIConstructor>(...): ...
-    for node in ast.walk(tree):
-        if isinstance(node, ast.With):
-            if id(node) in exclude_with_nodes:
-                continue
-            for item in node.items:
-                ce = item.context_expr
-                if isinstance(ce, ast.Call) and _is_ui_constructor_call(ce, ui_symbols):
-                    buckets["with_block_unmodeled"].append(node)
-                    break
+    for node in scan.with_nodes:
+        if id(node) in exclude_with_nodes:
+            continue
+        for item in node.items:
+            ce = item.context_expr
+            if type(ce) is _Call and type(ce.func) is _Name and ce.func.id in ui_symbols:
+                buckets["with_block_unmodeled"].append(node)
+                break
 
     # receiver.mount( <UIConstructor>(...) ) patterns
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
-            if node.func.attr == "mount":
-                if id(node) in exclude_mount_calls:
-                    continue
-                for a in node.args:
-                    if isinstance(a, ast.Call) and _is_ui_constructor_call(a, ui_symbols):
-                        buckets["mount_edges_unmodeled"].append(node)
-                        break
+    for node in scan.mount_calls:
+        if id(node) in exclude_mount_calls:
+            continue
+        for a in node.args:
+            if type(a) is _Call and type(a.func) is _Name and a.func.id in ui_symbols:
+                buckets["mount_edges_unmodeled"].append(node)
+                break
 
     # Starred children in constructor args: Container(*items)
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Call) and _is_ui_constructor_call(node, ui_symbols):
+    for node in scan.name_calls:
+        if node.func.id in ui_symbols:
             for a in node.args:
-                if isinstance(a, ast.Starred):
+                if type(a) is _Starred:
                     buckets["child_star_args"].append(node)
                     break
 
@@ -410,10 +753,9 @@ def _detect_unmodeled_patterns(
 def _feature_model_with_edges_v1(
     tree: ast.Module,
     ui_syms: Set[str],
-    call_to_node_id: Dict[Tuple[int, int, int, int], str],
+    call_to_node_id: Dict[int, str],
     *,
     edges: List["EdgeRec"],
-    children_map: Dict[str, List[str]],
     nodes: Dict[str, "NodeRec"],
     mirror_text: str,
     meta_refs: Dict[str, Any],
@@ -425,13 +767,6 @@ def _feature_model_with_edges_v1(
       exclude_with_nodes: Set[id(ast.With)] that were successfully modeled, so residue bucketing can ignore them.
     """
 
-    def node_key(call: ast.Call) -> Tuple[int, int, int, int]:
-        ln = int(getattr(call, "lineno", 0) or 0)
-        col = int(getattr(call, "col_offset", 0) or 0)
-        eln = int(getattr(call, "end_lineno", ln) or ln)
-        ecol = int(getattr(call, "end_col_offset", col) or col)
-        return (ln, col, eln, ecol)
-
     # Prevent duplicate edges if feature is re-run or overlaps with positional edges
     existing = {(e.parent, e.child, int(e.order_index)) for e in edges}
 
@@ -448,7 +783,7 @@ def _feature_model_with_edges_v1(
         if parent_call is None:
             continue
 
-        parent_id = call_to_node_id.get(node_key(parent_call))
+        parent_id = call_to_node_id.get(id(parent_call))
         if not parent_id:
             continue
 
@@ -502,7 +837,7 @@ def _feature_model_with_edges_v1(
         order = 0
         any_child = False
         for _ln, ccall in child_calls:
-            child_id = call_to_node_id.get(node_key(ccall))
+            child_id = call_to_node_id.get(id(ccall))
             if not child_id:
                 continue
 
@@ -517,7 +852,7 @@ def _feature_model_with_edges_v1(
                         focus=focus,
                     )
                 )
-                children_map[parent_id].append(child_id)
+                nodes[parent_id].children.append(child_id)
                 existing.add(tup)
 
             any_child = True
@@ -532,10 +867,14 @@ def _feature_model_with_edges_v1(
 # Main per-file tile builder
 # ----------------------------
 
-def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
+def build_layer3_tile_for_mirror(
+    mirror_path: Path,
+    const_index: Any = None,
+) -> Optional[Dict[str, Any]]:
     """
     Build a Layer3 pass-1 tile from a single mirror .py.md and its .meta.json sidecar.
     Returns tile JSON dict, or None if not a python mirror.
+    const_index: optional layer3_features_v2.ConstIndex shared across files for import-follow ids.
     """
     if not mirror_path.name.endswith(".py.md"):
         return None
@@ -590,22 +929,26 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
         return tile
 
     # Meta refs (anchors)
-    meta_refs, _by_sha1 = _build_meta_refs(meta)
+    meta_refs, _by_sha1, sha1_to_ref = _build_meta_refs(meta)
+    blocks = _TopLevelBlocks(tree, sha1_to_ref)
+
+    # One traversal feeds symbol detection, node collection, features, residue and roots.
+    scan = _scan_tree(tree, DIALECT_PREFIXES)
 
     # Dialect symbols (used)
-    ui_syms_list = _ui_symbols_used(tree, DIALECT_PREFIXES)
+    ui_syms_list = _ui_symbols_used(scan)
     ui_syms: Set[str] = set(ui_syms_list)
 
     # Collect constructor calls
-    calls = _find_ui_calls(tree, ui_syms)
+    calls = _find_ui_calls(scan, ui_syms)
 
     # Build node records with provenance
     raw_nodes: List[Tuple[ast.Call, Optional[str], Optional[ast.AST]]] = []
     for call in calls:
-        block = _enclosing_top_level_block(tree, call)  # top-level block node
+        block = blocks.enclosing(tree, call)  # top-level block node
         anchor_ref = None
         if block is not None:
-            anchor_ref = _anchor_ref_for_top_level_node(mirror_text, block, meta_refs)
+            anchor_ref = blocks.anchor_ref(mirror_text, block, meta_refs)
         raw_nodes.append((call, anchor_ref, block))
 
     # Deterministic sorting of calls (mirror coordinate based)
@@ -613,14 +956,14 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
         call, anchor_ref, _block = t
         ln = getattr(call, "lineno", 10**9)
         col = getattr(call, "col_offset", 10**9)
-        ty = call.func.id if isinstance(call.func, ast.Name) else ""
+        ty = call.func.id if type(call.func) is _Name else ""
         return (int(ln) if isinstance(ln, int) else 10**9, int(col) if isinstance(col, int) else 10**9, ty)
 
     raw_nodes.sort(key=call_sort_key)
 
     # Assign node_ids
     nodes: Dict[str, NodeRec] = {}
-    call_to_node_id: Dict[Tuple[int, int, int, int], str] = {}
+    call_to_node_id: Dict[int, str] = {}  # id(ast.Call) -> node_id; calls outlive this build
     node_calls: Dict[str, ast.Call] = {}  # v2: node_id -> ast.Call for feature passes
 
     edge_case_counts: Dict[str, int] = {
@@ -631,31 +974,21 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
         # v2 may add: id_pattern
     }
     edge_case_samples: List[Dict[str, Any]] = []
-
-    def node_key(c: ast.Call) -> Tuple[int, int, int, int]:
-        ln = getattr(c, "lineno", -1)
-        col = getattr(c, "col_offset", -1)
-        end = getattr(c, "end_lineno", ln)
-        endc = getattr(c, "end_col_offset", col)
-        return (
-            int(ln) if isinstance(ln, int) else -1,
-            int(col) if isinstance(col, int) else -1,
-            int(end) if isinstance(end, int) else -1,
-            int(endc) if isinstance(endc, int) else -1,
-        )
+    # shared provenance objects for this tile (see _prov)
+    prov_cache: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
 
     for i, (call, anchor_ref, block) in enumerate(raw_nodes, start=1):
-        nid = f"n{i:06d}"
-        call_to_node_id[node_key(call)] = nid
+        nid = "n%06d" % i
+        call_to_node_id[id(call)] = nid
         node_calls[nid] = call
 
         type_name = call.func.id  # strict Name(...) ensured
-        id_kind, id_val, reason = _extract_id_kw(call)
+        id_kind, id_val, reason, id_expr = _extract_id_kw(call)
 
         # provenance focus mapping (medium)
         focus = None
         if anchor_ref and block is not None:
-            anchor = _anchor_data(meta_refs, anchor_ref)
+            anchor = blocks.anchor_data(meta_refs, anchor_ref)
             if anchor:
                 focus = _focus_span_from_block(block, call, anchor)
 
@@ -667,6 +1000,7 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
             anchor_ref=anchor_ref,
             focus=focus,
             mirror_lno=int(getattr(call, "lineno", 10**9) or 10**9),
+            id_expr=id_expr,
         )
 
         if reason == "id_nonliteral":
@@ -677,18 +1011,13 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
                         "kind": "id_nonliteral",
                         "message": "UI constructor has id kwarg but value is not a string literal",
                         "type": type_name,
-                        "provenance": {"anchor_ref": anchor_ref, **({"focus": focus} if focus else {})},
+                        "provenance": _prov(anchor_ref, focus, prov_cache),
                     }
                 )
 
     # ----------------------------
     # Feature v2: ID resolution + ID patterns
     # ----------------------------
-    try:
-        from .layer3_features_v2 import apply_feature_v2_id_resolution  # type: ignore
-    except Exception:
-        apply_feature_v2_id_resolution = None  # type: ignore
-
     FEATURE_ID_RESOLUTION_V2 = True
     FEATURE_V2_VERBOSE = True
     repo_root = Path(meta.get("repo_root", ""))
@@ -702,30 +1031,30 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
             verbose=FEATURE_V2_VERBOSE,
             file_rel=source_rel,
             repo_root=repo_root,
+            const_index=const_index,
         )
 
     # Build edges (nested positional constructor calls)
     edges: List[EdgeRec] = []
-    children_map: Dict[str, List[str]] = {nid: [] for nid in nodes.keys()}
 
-    # For mapping a child call to node_id, we rely on exact lineno/col spans.
+    # Child calls map to node_ids by identity (same tree the nodes were built from).
     for call, anchor_ref, block in raw_nodes:
-        parent_id = call_to_node_id.get(node_key(call))
+        parent_id = call_to_node_id.get(id(call))
         if not parent_id:
             continue
 
         # Determine provenance for edge (parent call span)
         edge_focus = None
         if anchor_ref and block is not None:
-            anchor = _anchor_data(meta_refs, anchor_ref)
+            anchor = blocks.anchor_data(meta_refs, anchor_ref)
             if anchor:
                 edge_focus = _focus_span_from_block(block, call, anchor)
 
         order = 0
         for arg in call.args:
             # v1 modeled: positional arg that is UI constructor call
-            if isinstance(arg, ast.Call) and _is_ui_constructor_call(arg, ui_syms):
-                child_id = call_to_node_id.get(node_key(arg))
+            if type(arg) is _Call and type(arg.func) is _Name and arg.func.id in ui_syms:
+                child_id = call_to_node_id.get(id(arg))
                 if child_id:
                     edges.append(
                         EdgeRec(
@@ -736,43 +1065,43 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
                             focus=edge_focus,
                         )
                     )
-                    children_map[parent_id].append(child_id)
+                    nodes[parent_id].children.append(child_id)
                     order += 1
-            elif isinstance(arg, ast.Starred):
+            elif type(arg) is _Starred:
                 # residue bucket (already counted separately too)
                 pass
 
-    # Deterministic child ordering: already preserved by traversal order index
-    for pid in children_map:
-        pass
+    # Deterministic child ordering: already preserved by traversal order index (NodeRec.children)
 
     # ----------------------------
     # Feature v1: structure modeling (with + mount)
     # ----------------------------
-    # NOTE: this must run AFTER baseline edges/children_map exist,
+    # NOTE: this must run AFTER baseline edges/NodeRec.children exist,
     # and BEFORE residue bucketing.
-    from repo_ui.layer3_features import FeatureHooks, apply_with_edges_v1, apply_mount_edges_v1
-
+    # Built per tile: the block / anchor hooks are bound to this tile's memo.
     hooks = FeatureHooks(
         is_ui_constructor_call=_is_ui_constructor_call,
-        enclosing_top_level_block=_enclosing_top_level_block,
-        anchor_ref_for_top_level_node=_anchor_ref_for_top_level_node,
-        anchor_data=_anchor_data,
+        enclosing_top_level_block=blocks.enclosing,
+        anchor_ref_for_top_level_node=blocks.anchor_ref,
+        anchor_data=blocks.anchor_data,
         focus_span_from_block=_focus_span_from_block,
         expr_to_compact_text=_expr_to_compact_text,
     )
 
+    # Both features read their candidates from the shared scan.
+    candidates = FeatureCandidates(with_nodes=scan.with_nodes, mount_calls=scan.mount_calls)
+
     feat_with = apply_with_edges_v1(
         tree=tree,
         ui_syms=ui_syms,
         call_to_node_id=call_to_node_id,
         edges=edges,
-        children_map=children_map,
         nodes=nodes,
         mirror_text=mirror_text,
         meta_refs=meta_refs,
         edge_ctor=EdgeRec,
         hooks=hooks,
+        candidates=candidates,
     )
 
     feat_mount = apply_mount_edges_v1(
@@ -784,6 +1113,7 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
         meta_refs=meta_refs,
         edge_ctor=EdgeRec,
         hooks=hooks,
+        candidates=candidates,
     )
 
     # Print feature notes so missing wiring is obvious
@@ -794,7 +1124,7 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
     # Unmodeled patterns buckets (exclude modeled cases)
     # ----------------------------
     residues = _detect_unmodeled_patterns(
-        tree,
+        scan,
         ui_syms,
         exclude_with_nodes=feat_with.exclude_with_nodes,
         exclude_mount_calls=feat_mount.exclude_mount_calls,
@@ -804,25 +1134,25 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
         edge_case_counts[kind] = edge_case_counts.get(kind, 0) + len(nodes_ast)
         # Samples
         for n_ast in nodes_ast[: max(0, 10 - len(edge_case_samples))]:
-            block = _enclosing_top_level_block(tree, n_ast)  # type: ignore[arg-type]
+            block = blocks.enclosing(tree, n_ast)  # type: ignore[arg-type]
             anchor_ref = None
             focus = None
             if block is not None:
-                anchor_ref = _anchor_ref_for_top_level_node(mirror_text, block, meta_refs)
+                anchor_ref = blocks.anchor_ref(mirror_text, block, meta_refs)
                 if anchor_ref:
-                    anchor = _anchor_data(meta_refs, anchor_ref)
+                    anchor = blocks.anchor_data(meta_refs, anchor_ref)
                     if anchor:
                         focus = _focus_span_from_block(block, n_ast, anchor)  # type: ignore[arg-type]
             edge_case_samples.append(
                 {
                     "kind": kind,
                     "message": "pattern_detected_not_modeled_in_pass1",
-                    "provenance": {"anchor_ref": anchor_ref, **({"focus": focus} if focus else {})},
+                    "provenance": _prov(anchor_ref, focus, prov_cache),
                 }
             )
 
     # Roots via yield X(...)
-    yield_nodes = _find_yield_roots(tree, ui_syms)
+    yield_nodes = _find_yield_roots(scan, ui_syms)
     roots: List[RootRec] = []
 
     # Assign deterministic root ids by yield focus line
@@ -831,46 +1161,45 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
         call = y.value  # type: ignore[assignment]
         if not isinstance(call, ast.Call):
             continue
-        block = _enclosing_top_level_block(tree, y)
+        block = blocks.enclosing(tree, y)
         anchor_ref = None
         if block is not None:
-            anchor_ref = _anchor_ref_for_top_level_node(mirror_text, block, meta_refs)
+            anchor_ref = blocks.anchor_ref(mirror_text, block, meta_refs)
         lno = int(getattr(y, "lineno", 10**9) or 10**9)
         tmp_roots.append((lno, y, call, anchor_ref, block))
 
     tmp_roots.sort(key=lambda t: (t[0],))
 
-    def _context_for_yield(y: ast.Yield, module: ast.Module) -> Dict[str, str]:
+    # Top-level def/class spans, and each class's method spans (built on first yield inside it)
+    top_containers = _LineRanges(tree.body, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    class_methods: Dict[int, _LineRanges] = {}
+
+    def _context_for_yield(y: ast.Yield) -> Dict[str, str]:
         yln = getattr(y, "lineno", None)
-        yend = getattr(y, "end_lineno", None)
         if not isinstance(yln, int):
             return {"kind": "yield", "container": "unknown", "name": "unknown"}
-        for node in module.body:
-            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
-                nln = getattr(node, "lineno", None)
-                nend = getattr(node, "end_lineno", None)
-                if isinstance(nln, int) and isinstance(nend, int) and nln <= yln <= nend:
-                    if isinstance(node, ast.ClassDef):
-                        for sub in node.body:
-                            if isinstance(sub, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                                sln = getattr(sub, "lineno", None)
-                                send = getattr(sub, "end_lineno", None)
-                                if isinstance(sln, int) and isinstance(send, int) and sln <= yln <= send:
-                                    return {"kind": "yield", "container": "method", "name": sub.name}
-                        return {"kind": "yield", "container": "class", "name": node.name}
-                    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                        return {"kind": "yield", "container": "function", "name": node.name}
-        return {"kind": "yield", "container": "unknown", "name": "unknown"}
+        node = top_containers.covering(yln)
+        if node is None:
+            return {"kind": "yield", "container": "unknown", "name": "unknown"}
+        if isinstance(node, ast.ClassDef):
+            methods = class_methods.get(id(node))
+            if methods is None:
+                methods = class_methods[id(node)] = _LineRanges(node.body, (ast.FunctionDef, ast.AsyncFunctionDef))
+            sub = methods.covering(yln)
+            if sub is not None:
+                return {"kind": "yield", "container": "method", "name": sub.name}
+            return {"kind": "yield", "container": "class", "name": node.name}
+        return {"kind": "yield", "container": "function", "name": node.name}
 
     for i, (lno, y, call, anchor_ref, block) in enumerate(tmp_roots, start=1):
-        rid = f"r{i:06d}"
-        nid = call_to_node_id.get(node_key(call))
+        rid = "r%06d" % i
+        nid = call_to_node_id.get(id(call))
         if not nid:
             continue
 
         focus = None
         if anchor_ref and block is not None:
-            anchor = _anchor_data(meta_refs, anchor_ref)
+            anchor = blocks.anchor_data(meta_refs, anchor_ref)
             if anchor:
                 focus = _focus_span_from_block(block, y, anchor)
 
@@ -878,25 +1207,31 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
             RootRec(
                 root_id=rid,
                 node_id=nid,
-                context=_context_for_yield(y, tree),
+                context=_context_for_yield(y),
                 anchor_ref=anchor_ref,
                 focus=focus,
             )
         )
 
-    # Build trees: one per root (subtree via children_map)
+    # Build trees: one per root (subtree via NodeRec.children)
     trees_out: List[Dict[str, Any]] = []
     hashes_out: List[Dict[str, Any]] = []
+    # node_id -> canonical subtree string, shared by every root of this tile
+    canonical_memo: Dict[str, str] = {}
 
     def _collect_subtree(root_id: str) -> List[str]:
+        # pre-order; children pushed in one C-level extend (reversed, so they pop in order)
         out: List[str] = []
+        append = out.append
         stack: List[str] = [root_id]
+        pop = stack.pop
+        push_all = stack.extend
         while stack:
-            cur = stack.pop()
-            out.append(cur)
-            kids = children_map.get(cur, [])
-            for k in reversed(kids):
-                stack.append(k)
+            cur = pop()
+            append(cur)
+            kids = nodes[cur].children
+            if kids:
+                push_all(reversed(kids))
         return out
 
     for r in roots:
@@ -909,27 +1244,16 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
                 {
                     "node_id": n.node_id,
                     "type": n.type_name,
-                    "id": (
-                        {"kind": "literal", "value": n.id_value}
-                        if n.id_kind == "literal" and n.id_value is not None
-                        else (
-                            {"kind": n.id_kind, "value": n.id_value}
-                            if n.id_kind == "pattern" and n.id_value is not None
-                            else {"kind": n.id_kind}
-                        )
-                    ),
-                    "children": children_map.get(nid, []),
-                    "provenance": {
-                        "anchor_ref": n.anchor_ref,
-                        **({"focus": n.focus} if n.focus else {}),
-                    },
+                    "id": _id_payload(n.id_kind, n.id_value),
+                    "children": n.children,
+                    "provenance": _prov(n.anchor_ref, n.focus, prov_cache),
                 }
             )
 
         trees_out.append({"root_id": r.root_id, "root_node_id": root_nid, "nodes": tree_nodes})
 
-        canonical = _canonical_serialize(root_nid, nodes, children_map)
-        layout_hash = "sha1:" + _sha1_text(canonical)
+        canonical = _canonical_serialize(root_nid, nodes, canonical_memo)
+        layout_hash = _layout_hash(canonical)
 
         hashes_out.append(
             {
@@ -938,28 +1262,28 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
                 "canonical": canonical,
                 "includes_ids": True,
                 "child_order_matters": True,
-                "provenance": {"anchor_ref": r.anchor_ref, **({"focus": r.focus} if r.focus else {})},
+                "provenance": _prov(r.anchor_ref, r.focus, prov_cache),
             }
         )
 
     # Indexes
-    ids_by_value: Dict[str, List[str]] = {}
-    types_by_name: Dict[str, List[str]] = {}
-    hashes_by_value: Dict[str, List[str]] = {}
+    ids_by_value: DefaultDict[str, List[str]] = defaultdict(list)
+    types_by_name: DefaultDict[str, List[str]] = defaultdict(list)
+    hashes_by_value: DefaultDict[str, List[str]] = defaultdict(list)
 
     nodes_without_id = 0
 
     for nid, n in nodes.items():
-        types_by_name.setdefault(n.type_name, []).append(nid)
+        types_by_name[n.type_name].append(nid)
         if n.id_kind == "literal" and n.id_value is not None:
-            ids_by_value.setdefault(n.id_value, []).append(nid)
+            ids_by_value[n.id_value].append(nid)
         elif n.id_kind == "none":
             nodes_without_id += 1
 
     for h in hashes_out:
         hv = h["layout_hash"]
         rid = h["root_id"]
-        hashes_by_value.setdefault(hv, []).append(rid)
+        hashes_by_value[hv].append(rid)
 
     # Edge cases buckets list
     buckets_out = []
@@ -971,41 +1295,34 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
     # Pool JSON
     constructors_out = []
 
+    # Sort-key inputs as flat int tables: anchor start per ref (one _anchor_data per distinct ref,
+    # not per node) and focus start per node (shared by the node and edge orderings).
+    anchor_start: Dict[Optional[str], int] = {None: 10**9}
+    focus_start: Dict[str, int] = {}
+    for nid, n in nodes.items():
+        ref = n.anchor_ref
+        if ref not in anchor_start:
+            a = blocks.anchor_data(meta_refs, ref) if ref else None
+            anchor_start[ref] = a.start_line if a else 10**9
+        focus_start[nid] = n.focus["start_line"] if n.focus and "start_line" in n.focus else 10**9
+
     def node_sort_key(n: NodeRec) -> Tuple[int, int, str, str]:
-        a_start = 10**9
-        if n.anchor_ref:
-            a = _anchor_data(meta_refs, n.anchor_ref)
-            if a:
-                a_start = a.start_line
-        f_start = n.focus["start_line"] if n.focus and "start_line" in n.focus else 10**9
-        idv = n.id_value or ""
-        return (a_start, f_start, n.type_name, idv)
-
-    for nid in sorted(nodes.keys(), key=lambda k: node_sort_key(nodes[k])):
-        n = nodes[nid]
+        return (anchor_start[n.anchor_ref], focus_start[n.node_id], n.type_name, n.id_value or "")
+
+    for n in sorted(nodes.values(), key=node_sort_key):
         constructors_out.append(
             {
                 "node_id": n.node_id,
                 "type": n.type_name,
-                "id": (
-                    {"kind": "literal", "value": n.id_value}
-                    if n.id_kind == "literal" and n.id_value is not None
-                    else (
-                        {"kind": "pattern", "value": n.id_value}
-                        if n.id_kind == "pattern" and n.id_value is not None
-                        else {"kind": n.id_kind}
-                    )
-                ),
-                "provenance": {"anchor_ref": n.anchor_ref, **({"focus": n.focus} if n.focus else {})},
+                "id": _id_payload(n.id_kind, n.id_value),
+                "provenance": _prov(n.anchor_ref, n.focus, prov_cache),
             }
         )
 
     edges_out = []
 
     def edge_sort_key(e: EdgeRec) -> Tuple[int, int, str, str]:
-        p = nodes.get(e.parent)
-        p_start = p.focus["start_line"] if p and p.focus else 10**9
-        return (p_start, e.order_index, e.parent, e.child)
+        return (focus_start.get(e.parent, 10**9), e.order_index, e.parent, e.child)
 
     for e in sorted(edges, key=edge_sort_key):
         edges_out.append(
@@ -1013,7 +1330,7 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
                 "parent": e.parent,
                 "child": e.child,
                 "order_index": e.order_index,
-                "provenance": {"anchor_ref": e.anchor_ref, **({"focus": e.focus} if e.focus else {})},
+                "provenance": _prov(e.anchor_ref, e.focus, prov_cache),
             }
         )
 
@@ -1024,7 +1341,7 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
                 "root_id": r.root_id,
                 "node_id": r.node_id,
                 "context": r.context,
-                "provenance": {"anchor_ref": r.anchor_ref, **({"focus": r.focus} if r.focus else {})},
+                "provenance": _prov(r.anchor_ref, r.focus, prov_cache),
             }
         )
 
@@ -1047,7 +1364,8 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
             "trees": {"count": len(trees_out), "trees": trees_out},
             "hashes": {"count": len(hashes_out), "items": hashes_out},
         },
-        "indexes": {"ids_by_value": ids_by_value, "types_by_name": types_by_name, "hashes_by_value": hashes_by_value},
+        # plain dicts in the tile: lookups of absent keys must not insert
+        "indexes": {"ids_by_value": dict(ids_by_value), "types_by_name": dict(types_by_name), "hashes_by_value": dict(hashes_by_value)},
         "edge_cases": {"buckets": buckets_out, "samples": edge_case_samples[:10]},
         "stats": {
             "ui_symbols_used": len(ui_syms_list),
@@ -1065,7 +1383,115 @@ def build_layer3_tile_for_mirror(mirror_path: Path) -> Optional[Dict[str, Any]]:
 # Repo-level driver
 # ----------------------------
 
-def build_layer3_pass1(repo_root: Path) -> None:
+# ----------------------------
+# Parallel tile driver
+# ----------------------------
+
+# Set in each pool worker by _init_tile_worker, so the (large) const index is sent once per worker.
+_worker_const_index: Any = None
+
+
+def _init_tile_worker(const_index: Any) -> None:
+    global _worker_const_index
+    _worker_const_index = const_index
+
+
+def _build_tiles_captured(mirror_paths: List[Path]) -> List[Tuple[Optional[Dict[str, Any]], str]]:
+    # Worker side: per mirror, the tile plus everything it printed, replayed by the parent in file order.
+    results: List[Tuple[Optional[Dict[str, Any]], str]] = []
+    for mirror_path in mirror_paths:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            tile = build_layer3_tile_for_mirror(mirror_path, const_index=_worker_const_index)
+        results.append((tile, out.getvalue()))
+    return results
+
+
+def build_all_tiles(
+    mirror_paths: List[Path],
+    *,
+    const_index: Any = None,
+) -> Iterator[Tuple[Path, Optional[Dict[str, Any]]]]:
+    """
+    Yield (mirror_path, tile) for every mirror, in input order.
+    Tiles are independent, so PARALLEL_TILE_MIN_FILES or more mirrors are built in a process pool;
+    serial otherwise, or when a pool cannot be started here (falls back only if nothing was yielded
+    yet). Worker output is printed in input order either way, so the log reads the same as a serial run.
+
+    Pool tiles stream out batch by batch, with at most TILE_BUILD_AHEAD_PER_WORKER batches per worker
+    in flight, so the parent never holds more than that window of built tiles. Workers get
+    const_index.precomputed() (constant tables only, no source texts).
+    """
+    if len(mirror_paths) >= PARALLEL_TILE_MIN_FILES:
+        workers = os.cpu_count() or 1
+        chunksize = max(1, min(TILE_BUILD_BATCH_MAX, len(mirror_paths) // (4 * workers)))
+        batches = [mirror_paths[i : i + chunksize] for i in range(0, len(mirror_paths), chunksize)]
+        ahead = workers * TILE_BUILD_AHEAD_PER_WORKER
+        worker_index = const_index.precomputed() if const_index is not None else None
+        yielded = False
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_tile_worker,
+                initargs=(worker_index,),
+            ) as ex:
+                todo = iter(batches)
+                pending: Deque[Tuple[List[Path], Future]] = deque()
+                try:
+                    while True:
+                        for batch in todo:
+                            pending.append((batch, ex.submit(_build_tiles_captured, batch)))
+                            if len(pending) >= ahead:
+                                break
+                        if not pending:
+                            break
+                        batch, fut = pending.popleft()
+                        for mirror_path, (tile, log) in zip(batch, fut.result()):
+                            if log:
+                                sys.stdout.write(log)
+                            yielded = True
+                            yield mirror_path, tile
+                finally:
+                    for _batch, fut in pending:
+                        fut.cancel()
+            return
+        except (OSError, BrokenProcessPool):
+            if yielded:
+                raise
+
+    for mirror_path in mirror_paths:
+        yield mirror_path, build_layer3_tile_for_mirror(mirror_path, const_index=const_index)
+
+
+def _iter_mirror_paths(mirror_root: Path) -> Iterator[Path]:
+    """
+    Every *.py.md under mirror_root, in os.walk (top-down) order: a directory's files in scandir
+    order, then each subdirectory in turn. Uses the DirEntry type info scandir already has
+    instead of os.walk's per-directory lists; like os.walk, symlinked dirs are not followed and
+    unreadable dirs are skipped.
+    """
+    stack: List[str] = [os.fspath(mirror_root)]
+    while stack:
+        top = stack.pop()
+        subdirs: List[str] = []
+        try:
+            with os.scandir(top) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif entry.name.endswith(".py.md"):
+                        yield Path(entry.path)
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
+
+
+def build_layer3_pass1(repo_root: Path, const_index: Any = None) -> None:
     mirror_root = repo_root / MIRROR_ROOT
     if not mirror_root.exists():
         raise FileNotFoundError(f"mirror root not found: {mirror_root}")
@@ -1075,60 +1501,91 @@ def build_layer3_pass1(repo_root: Path) -> None:
     out_index_path = repo_root / OUT_INDEX_PATH
 
     tiles_written = 0
-    repo_id_index: Dict[str, List[Dict[str, Any]]] = {}
-    repo_layout_index: Dict[str, List[Dict[str, Any]]] = {}
+    repo_id_index: DefaultDict[str, List[Dict[str, Any]]] = defaultdict(list)
+    repo_layout_index: DefaultDict[str, List[Dict[str, Any]]] = defaultdict(list)
     repo_edge_buckets: Dict[str, int] = {}
 
     # Walk mirror root for .py.md files
-    for dirpath, _dirnames, filenames in os.walk(mirror_root):
-        for fn in filenames:
-            if not fn.endswith(".py.md"):
-                continue
-            mirror_path = Path(dirpath) / fn
-            tile = build_layer3_tile_for_mirror(mirror_path)
-            if tile is None:
-                continue
+    mirror_paths = list(_iter_mirror_paths(mirror_root))
+
+    # Tiles are not mutated after submit (aggregation below only reads them).
+    io_pool = ThreadPoolExecutor(max_workers=TILE_WRITE_WORKERS)
+    tile_writes: List[Future] = []
+    # (tile_rel, out_path, contribution) per written tile, logged for repo_ui.query once the tile is on disk
+    wal_pending: List[Tuple[str, Path, Dict[str, Any]]] = []
+    for mirror_path, tile in build_all_tiles(mirror_paths, const_index=const_index):
+        if tile is None:
+            continue
 
-            # Tile output path: tiles/<source_rel>.layer3.json
-            source_rel = tile["source"]["source_rel"]
-            out_path = out_tiles_root / (source_rel + ".layer3.json")
-            _write_json(out_path, tile)
-            tiles_written += 1
-
-            # Aggregate indexes
-            for idv, node_ids in (tile.get("indexes", {}).get("ids_by_value") or {}).items():
-                for nid in node_ids:
-                    repo_id_index.setdefault(idv, []).append(
-                        {
-                            "file": source_rel,
-                            "node_id": nid,
-                            "tile_rel": out_path.relative_to(repo_root).as_posix(),
-                        }
-                    )
+        # Tile output path: tiles/<source_rel>.layer3.json
+        source_rel = tile["source"]["source_rel"]
+        out_path = out_tiles_root / (source_rel + ".layer3.json")
+        tile_writes.append(io_pool.submit(_write_json, out_path, tile))
+        tiles_written += 1
+
+        # Aggregate indexes
+        tile_rel = out_path.relative_to(repo_root).as_posix()
+        wal_pending.append((tile_rel, out_path, tile_contribution(tile)))
+        for idv, node_ids in (tile.get("indexes", {}).get("ids_by_value") or {}).items():
+            for nid in node_ids:
+                repo_id_index[idv].append(
+                    {
+                        "file": source_rel,
+                        "node_id": nid,
+                        "tile_rel": tile_rel,
+                    }
+                )
 
-            for hv, root_ids in (tile.get("indexes", {}).get("hashes_by_value") or {}).items():
-                for rid in root_ids:
-                    repo_layout_index.setdefault(hv, []).append(
-                        {
-                            "file": source_rel,
-                            "root_id": rid,
-                            "tile_rel": out_path.relative_to(repo_root).as_posix(),
-                        }
-                    )
+        for hv, root_ids in (tile.get("indexes", {}).get("hashes_by_value") or {}).items():
+            for rid in root_ids:
+                repo_layout_index[hv].append(
+                    {
+                        "file": source_rel,
+                        "root_id": rid,
+                        "tile_rel": tile_rel,
+                    }
+                )
+
+        for b in (tile.get("edge_cases", {}).get("buckets") or []):
+            kind = b.get("kind")
+            cnt = int(b.get("count", 0) or 0)
+            if kind:
+                repo_edge_buckets[kind] = repo_edge_buckets.get(kind, 0) + cnt
 
-            for b in (tile.get("edge_cases", {}).get("buckets") or []):
-                kind = b.get("kind")
-                cnt = int(b.get("count", 0) or 0)
-                if kind:
-                    repo_edge_buckets[kind] = repo_edge_buckets.get(kind, 0) + cnt
+    # All tiles on disk (write errors re-raised here) before the index that points at them
+    try:
+        for fut in tile_writes:
+            fut.result()
+    finally:
+        io_pool.shutdown(wait=True)
+
+    # Aggregate deltas carry the written file's stat, so the query side folds them in without re-parsing
+    wal_entries: List[Dict[str, Any]] = []
+    for tile_rel, out_path, contrib in wal_pending:
+        try:
+            st = out_path.stat()
+        except OSError:
+            continue
+        wal_entries.append(
+            {
+                "contract_version": AGGREGATES_CONTRACT,
+                "op": "upsert",
+                "tile_rel": tile_rel,
+                "mtime_ns": st.st_mtime_ns,
+                "size": st.st_size,
+                **contrib,
+            }
+        )
+    append_wal(repo_root, wal_entries)
+    compact_wal_if_large(repo_root)  # repeated runs without a query must not grow the log unbounded
 
     # Repo index payload
     index_payload = {
         "contract_version": CONTRACT_VERSION_INDEX,
         "run_id": None,  # mixed; can be filled if you want a single-run constraint
         "tiles_written": tiles_written,
-        "id_index": repo_id_index,
-        "layout_index": repo_layout_index,
+        "id_index": dict(repo_id_index),
+        "layout_index": dict(repo_layout_index),
         "edge_cases": {"buckets": [{"kind": k, "count": repo_edge_buckets[k]} for k in sorted(repo_edge_buckets.keys())]},
     }
     _write_json(out_index_path, index_payload)
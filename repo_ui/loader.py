@@ -1,20 +1,75 @@
 import hashlib
 import json
+import mmap
 import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+
+# Files at least this large are hashed/decoded straight from an mmap view instead of a bytes copy.
+MMAP_MIN_BYTES = 64 * 1024
+
+# {rel_path: {mtime_ns, size, sha1}} from the previous run; a matching (mtime_ns, size) reuses the sha1.
+SOURCE_CACHE_REL = Path("shadow_ui") / ".loader_cache.json"
+SOURCE_CACHE_CONTRACT = "loader_source_cache_v4"  # bump when the entry shape/semantics change
+# Files modified this recently before the scan started are hashed but neither trusted from nor written
+# to the cache: a same-size rewrite within the same mtime tick (coarse filesystem clocks) would
+# otherwise keep a stale sha1.
+SOURCE_CACHE_RACY_NS = 2_000_000_000
+
+# Kept source suffixes, matched case-insensitively. Lower-case names match as-is; only other names
+# pay for lower-casing, and then just their last SOURCE_SUFFIX_MAX_LEN characters.
+SOURCE_SUFFIXES = (".py", ".tcss")
+SOURCE_SUFFIX_MAX_LEN = 5
+
+# Upper bound on reader threads in load_repo.
+INGEST_MAX_WORKERS = 32
+
+# Records read ahead of the consumer per reader thread in iter_repo.
+INGEST_READ_AHEAD_PER_WORKER = 2
 
 
 def load_repo(repo_root: Path) -> List[Dict[str, Any]]:
     """
-    Loads .py and .tcss sources from include roots in folders.json.
+    Loads .py and .tcss sources from include roots in folders.json, as a list (see iter_repo).
 
-    Emits a per-file cache dict containing:
+    The pipeline makes several passes over the result (mirrors, css, const index), so it is
+    materialized here; single-pass consumers can use iter_repo and drop each record as they go.
+    """
+    files_cache: List[Dict[str, Any]] = []
+    py_count = 0
+    tcss_count = 0
+    for rec in iter_repo(repo_root):
+        files_cache.append(rec)
+        ext = rec["ext"]
+        if ext == ".py":
+            py_count += 1
+        elif ext == ".tcss":
+            tcss_count += 1
+
+    print(f"[loader] done  files={len(files_cache)}  py={py_count}  tcss={tcss_count}")
+
+    return files_cache
+
+
+def iter_repo(repo_root: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Yields one cache dict per .py / .tcss source under the include roots in folders.json,
+    in rel_path order, as soon as that file has been read.
+
+    Each cache dict contains:
       - abs_path, rel_path, ext
       - text (decoded with utf-8, errors="replace")
       - source_sha1: sha1 over raw file bytes (stable identity)
       - source_bytes, source_mtime_ns
       - encoding, read_errors_mode
+
+    source_sha1 is reused from the previous run's cache (SOURCE_CACHE_REL) when a file's
+    mtime_ns and size are unchanged and the mtime is older than SOURCE_CACHE_RACY_NS before the scan;
+    the text is always read fresh. The cache is rewritten once the iterator is exhausted.
     """
     print("[loader] reading folders.json")
 
@@ -27,57 +82,88 @@ def load_repo(repo_root: Path) -> List[Dict[str, Any]]:
     print(f"[loader] include_root_folders = {include_roots}")
     print(f"[loader] ignore_dir_names = {len(ignore_dirs)} entries")
 
-    files_cache: List[Dict[str, Any]] = []
+    cache_path = repo_root / SOURCE_CACHE_REL
+    prev_cache = _load_source_cache(cache_path)
+    next_cache: Dict[str, Dict[str, Any]] = {}
+    racy_after = time.time_ns() - SOURCE_CACHE_RACY_NS
 
-    def walk(dir_path: Path) -> None:
-        try:
-            with os.scandir(dir_path) as it:
-                for entry in it:
-                    if entry.is_dir(follow_symlinks=False):
-                        if entry.name in ignore_dirs:
-                            continue
-                        walk(Path(entry.path))
-                    elif entry.is_file(follow_symlinks=False):
-                        name = entry.name.lower()
-                        if name.endswith(".py") or name.endswith(".tcss"):
-                            p = Path(entry.path)
-
-                            # Read raw bytes once to derive stable identity.
-                            try:
-                                raw = p.read_bytes()
-                            except OSError:
+    # (entry, repo-relative path string)
+    source_entries: List[Tuple[os.DirEntry, str]] = []
+
+    # Producer: scandir only, no file I/O. Iterative, on plain strings; ignored dirs are never pushed.
+    def walk(root_path: Path) -> None:
+        root_str = str(root_path)
+        # entry.path always starts with root_str, so rel paths are a prefix swap instead of relative_to
+        root_rel = str(root_path.relative_to(repo_root))
+        cut = len(root_str)
+
+        stack = [root_str]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name in ignore_dirs:
                                 continue
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            name = entry.name
+                            if name.endswith(SOURCE_SUFFIXES) or name[-SOURCE_SUFFIX_MAX_LEN:].lower().endswith(SOURCE_SUFFIXES):
+                                source_entries.append((entry, root_rel + entry.path[cut:]))
+            except PermissionError:
+                pass
 
-                            source_sha1 = hashlib.sha1(raw).hexdigest()
-                            source_bytes = len(raw)
-
-                            # Decode for AST/text processing (lossy but explicit).
-                            encoding = "utf-8"
-                            read_errors_mode = "replace"
-                            text = raw.decode(encoding, errors=read_errors_mode)
-
-                            try:
-                                st = p.stat()
-                                mtime_ns = getattr(st, "st_mtime_ns", None)
-                            except OSError:
-                                mtime_ns = None
-
-                            files_cache.append(
-                                {
-                                    "abs_path": p,
-                                    "rel_path": p.relative_to(repo_root),
-                                    "ext": p.suffix,
-                                    "text": text,
-                                    # provenance / identity
-                                    "source_sha1": source_sha1,
-                                    "source_bytes": source_bytes,
-                                    "source_mtime_ns": mtime_ns,
-                                    "encoding": encoding,
-                                    "read_errors_mode": read_errors_mode,
-                                }
-                            )
-        except PermissionError:
-            pass
+    # Worker: read -> hash -> decode -> stat for one file (None if unreadable).
+    def ingest(item: Tuple[os.DirEntry, str]) -> Optional[Dict[str, Any]]:
+        entry, rel_str = item
+        p = Path(entry.path)
+        rel_path = Path(rel_str)
+
+        # Decode for AST/text processing (lossy but explicit).
+        encoding = "utf-8"
+        read_errors_mode = "replace"
+
+        # stat before reading so a (mtime_ns, size) match can vouch for the cached hash.
+        # DirEntry.stat caches its result (and is free on Windows, where scandir already has it).
+        try:
+            st = entry.stat(follow_symlinks=False)
+            mtime_ns = getattr(st, "st_mtime_ns", None)
+        except OSError:
+            st = None
+            mtime_ns = None
+
+        known: Optional[Tuple[int, str]] = None
+        prev = prev_cache.get(rel_path.as_posix())
+        if prev and st is not None and mtime_ns is not None and mtime_ns < racy_after:
+            cached_sha1 = str(prev.get("sha1", ""))
+            if prev.get("mtime_ns") == mtime_ns and prev.get("size") == st.st_size and cached_sha1:
+                known = (st.st_size, cached_sha1)
+
+        # Read raw bytes once to derive stable identity.
+        try:
+            source_sha1, text, source_bytes = _read_source(
+                entry.path,
+                encoding,
+                read_errors_mode,
+                known=known,
+                size_hint=st.st_size if st is not None else None,
+            )
+        except OSError:
+            return None
+
+        return {
+            "abs_path": p,
+            "rel_path": rel_path,
+            "ext": p.suffix,
+            "text": text,
+            # provenance / identity
+            "source_sha1": source_sha1,
+            "source_bytes": source_bytes,
+            "source_mtime_ns": mtime_ns,
+            "encoding": encoding,
+            "read_errors_mode": read_errors_mode,
+        }
 
     print("[loader] scanning filesystem...")
 
@@ -86,9 +172,118 @@ def load_repo(repo_root: Path) -> List[Dict[str, Any]]:
         if root_path.exists() and root_path.is_dir():
             walk(root_path)
 
-    py_count = sum(1 for f in files_cache if f["ext"] == ".py")
-    tcss_count = sum(1 for f in files_cache if f["ext"] == ".tcss")
+    # Deterministic order regardless of scandir order; the in-order window below keeps it, so records stream out sorted.
+    source_entries.sort(key=lambda item: item[1].replace(os.sep, "/"))
 
-    print(f"[loader] done  files={len(files_cache)}  py={py_count}  tcss={tcss_count}")
+    def emit(rec: Dict[str, Any]) -> Dict[str, Any]:
+        if rec["source_mtime_ns"] is not None and rec["source_mtime_ns"] < racy_after:
+            next_cache[rec["rel_path"].as_posix()] = {
+                "mtime_ns": rec["source_mtime_ns"],
+                "size": rec["source_bytes"],
+                "sha1": rec["source_sha1"],
+            }
+        return rec
 
-    return files_cache
+    # Files are independent; threads overlap the I/O waits (hashlib and file reads release the GIL).
+    # At most INGEST_READ_AHEAD_PER_WORKER records per worker are in flight, so a slow consumer
+    # holds a bounded window of file texts rather than the whole repo.
+    if len(source_entries) > 1:
+        workers = min(INGEST_MAX_WORKERS, (os.cpu_count() or 1) * 4, len(source_entries))
+        ahead = workers * INGEST_READ_AHEAD_PER_WORKER
+        pending: Deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            try:
+                for item in source_entries:
+                    pending.append(ex.submit(ingest, item))
+                    if len(pending) >= ahead:
+                        rec = pending.popleft().result()
+                        if rec is not None:
+                            yield emit(rec)
+                while pending:
+                    rec = pending.popleft().result()
+                    if rec is not None:
+                        yield emit(rec)
+            finally:
+                for fut in pending:
+                    fut.cancel()
+    else:
+        for item in source_entries:
+            rec = ingest(item)
+            if rec is not None:
+                yield emit(rec)
+
+    # Only files seen this run are kept, so deleted files drop out of the cache.
+    _write_source_cache(cache_path, next_cache)
+
+
+def _read_source(
+    path: str,
+    encoding: str,
+    errors: str,
+    *,
+    known: Optional[Tuple[int, str]] = None,
+    size_hint: Optional[int] = None,
+) -> Tuple[str, str, int]:
+    """
+    Returns (sha1 hex over raw bytes, decoded text, byte count).
+    Large files are mapped rather than read, so hashing and decoding share one view with no extra copy.
+    known=(size, sha1) skips hashing when the bytes read still have that size.
+    size_hint (the caller's stat size) spares an fstat and sizes the first read.
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = size_hint if size_hint is not None else os.fstat(fd).st_size
+        if size >= MMAP_MIN_BYTES:
+            try:
+                mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                mm = None
+            if mm is not None:
+                with mm:
+                    return _sha1_unless_known(mm, known), str(mm, encoding, errors), len(mm)
+        raw = _read_all(fd, size)
+    finally:
+        os.close(fd)
+    return _sha1_unless_known(raw, known), raw.decode(encoding, errors=errors), len(raw)
+
+
+def _read_all(fd: int, size: int) -> bytes:
+    # Ask for one byte more than expected: a short read means EOF, so an unchanged file costs one read.
+    want = size + 1
+    parts: List[bytes] = []
+    while True:
+        chunk = os.read(fd, want)
+        parts.append(chunk)
+        if len(chunk) < want:
+            break
+        want = MMAP_MIN_BYTES
+    return parts[0] if len(parts) == 1 else b"".join(parts)
+
+
+def _sha1_unless_known(buf: Any, known: Optional[Tuple[int, str]]) -> str:
+    if known is not None and known[0] == len(buf):
+        return known[1]
+    return hashlib.sha1(buf).hexdigest()
+
+
+def _load_source_cache(path: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Best-effort load; a missing, corrupt, or stale-contract cache is treated as empty.
+    """
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("contract_version") != SOURCE_CACHE_CONTRACT:
+        return {}
+    files = data.get("files")
+    return files if isinstance(files, dict) else {}
+
+
+def _write_source_cache(path: Path, files: Dict[str, Dict[str, Any]]) -> None:
+    # tmp + rename, so an interrupted run never leaves a truncated cache behind
+    payload = {"contract_version": SOURCE_CACHE_CONTRACT, "files": files}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
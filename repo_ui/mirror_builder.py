@@ -3,9 +3,22 @@ from __future__ import annotations
 import ast
 import hashlib
 import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Set, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    # Optional: C encoder; same bytes as json.dumps(ensure_ascii=False, indent=2) for meta payloads.
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None  # type: ignore[assignment]
+
+# Below this many python files, process-pool startup costs more than parsing them.
+PARALLEL_MIRROR_MIN_FILES = 8
 
 def build_mirrors(
     repo_root: Path,
@@ -89,59 +102,124 @@ def build_mirrors(
     py_files = [f for f in files_cache if (f.get("ext") or "").lower() == ".py"]
     log(f"scanning python files for ring0 membership ({len(py_files)})")
 
-    ring0_candidates: List[Tuple[Dict[str, Any], Set[str], int]] = []
+    ring0_count = 0
     parse_errors = 0
+    skipped_no_output = 0
+    built: List[PyMirror] = []
 
-    for f in py_files:
-        text = f.get("text", "")
-        try:
-            tree = ast.parse(text)
-        except SyntaxError:
+    for status, mirror in _build_py_mirrors(py_files, run_id):
+        if status == "parse_error":
             parse_errors += 1
             continue
+        if status == "not_ring0":
+            continue
+        ring0_count += 1
+        if mirror is None:
+            skipped_no_output += 1
+            continue
+        built.append(mirror)
 
-        imported_names = _collect_textual_imported_names(tree)
-        if imported_names:
-            ring0_candidates.append((f, imported_names, len(imported_names)))
-
-    log(f"ring-0 python files detected ({len(ring0_candidates)})  parse_errors={parse_errors}")
+    log(f"ring-0 python files detected ({ring0_count})  parse_errors={parse_errors}")
 
+    # Writes stay on this process, in py_files order.
     written_py = 0
-    skipped_no_output = 0
+    for rel_md, content, meta, cache_entry in built:
+        write_mirror_with_meta(mirror_root, rel_md, content, meta)
+        written_py += 1
+        mirror_cache[cache_entry["source_rel"]] = cache_entry
 
-    for f, imported_names, _n in ring0_candidates:
-        text = f.get("text", "")
-        try:
-            tree = ast.parse(text)
-        except SyntaxError:
+    log(
+        "done  "
+        f"mirrors_written={len(mirror_cache)}  "
+        f"(tcss={len(tcss_files)} py={written_py})  "
+        f"ring0_py_no_output={skipped_no_output}  "
+        f"py_parse_errors={parse_errors}"
+    )
+
+    return mirror_cache
+
+# ----------------------------
+# Ring0 python mirrors (per file)
+# ----------------------------
+
+# (rel_md, content, meta, mirror_cache entry) for one Ring0 python file
+PyMirror = Tuple[Path, str, Dict[str, Any], Dict[str, Any]]
+
+
+def _build_py_mirror(args: Tuple[Dict[str, Any], str]) -> Tuple[str, Optional[PyMirror]]:
+    """
+    Mirror content + meta for one python file, without touching disk.
+    Returns (status, mirror): status is "parse_error", "not_ring0", "no_output" or "ok";
+    mirror is set only for "ok". Pure, so it can run in a pool worker.
+    """
+    f, run_id = args
+    text = f.get("text", "")
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return "parse_error", None
+
+    imported_names = _collect_textual_imported_names(tree)
+    if not imported_names:
+        return "not_ring0", None
+
+    # Collect *all* Name ids used anywhere in file, plus the Name ids under each top-level block.
+    used_name_ids, block_names = _scan_name_ids(tree)
+
+    # Encoded once; snippets (and their sha1s) are slices of it (see _snippet_for_node)
+    src_bytes = text.encode("utf-8")
+    offs = _line_offsets(src_bytes)
+
+    # --- Carry over ONLY used "from textual..." imports (top-level only) ---
+    import_stmts: List[str] = []
+    import_meta: List[Dict[str, Any]] = []
+
+    for node in tree.body:
+        if not isinstance(node, ast.ImportFrom):
             continue
 
-        # Collect *all* Name ids used anywhere in file.
-        used_name_ids: Set[str] = set()
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
-                used_name_ids.add(node.id)
+        mod = node.module
+        if not _is_textual_module(mod):
+            continue
 
-        # --- Carry over ONLY used "from textual..." imports (top-level only) ---
-        import_stmts: List[str] = []
-        import_meta: List[Dict[str, Any]] = []
+        # Names bound by this import statement
+        bound = [(a.asname or a.name) for a in node.names if a.name != "*"]
 
-        for node in tree.body:
-            if not isinstance(node, ast.ImportFrom):
-                continue
+        # Keep the statement only if at least one bound name is used somewhere.
+        if not any(name in used_name_ids for name in bound):
+            continue
 
-            mod = node.module or ""
-            if not (mod == "textual" or mod.startswith("textual.")):
-                continue
+        src, src_sha1 = _snippet_for_node(text, src_bytes, offs, node)
+        if not src:
+            continue
 
-            # Names bound by this import statement
-            bound = [(a.asname or a.name) for a in node.names if a.name != "*"]
+        ln = getattr(node, "lineno", None)
+        end = getattr(node, "end_lineno", None)
+        if not (isinstance(ln, int) and isinstance(end, int) and end >= ln):
+            ln, end = _lineno_span_fallback(text, src)
 
-            # Keep the statement only if at least one bound name is used somewhere.
-            if not any(name in used_name_ids for name in bound):
-                continue
+        import_stmts.append(src)
+        import_meta.append(
+            {
+                "snippet_kind": "py_import_textual_used",
+                "node_kind": type(node).__name__,
+                "module": mod,
+                "bound_names": bound,
+                "used_bound_names": sorted([n for n in bound if n in used_name_ids]),
+                "start_line": ln,
+                "end_line": end,
+                "snippet_sha1": src_sha1,
+                "snippet_len_chars": len(src),
+            }
+        )
+
+    # --- Existing behavior: capture relevant top-level blocks ---
+    blocks: List[str] = []
+    block_meta: List[Dict[str, Any]] = []
 
-            src = _source_for_node(text, node)
+    for node in tree.body:
+        if _is_top_level_block(node) and not block_names[id(node)].isdisjoint(imported_names):
+            src, src_sha1 = _snippet_for_node(text, src_bytes, offs, node)
             if not src:
                 continue
 
@@ -150,117 +228,94 @@ def build_mirrors(
             if not (isinstance(ln, int) and isinstance(end, int) and end >= ln):
                 ln, end = _lineno_span_fallback(text, src)
 
-            import_stmts.append(src)
-            import_meta.append(
+            blocks.append(src)
+            block_meta.append(
                 {
-                    "snippet_kind": "py_import_textual_used",
+                    "snippet_kind": "py_top_level_block",
                     "node_kind": type(node).__name__,
-                    "module": mod,
-                    "bound_names": bound,
-                    "used_bound_names": sorted([n for n in bound if n in used_name_ids]),
                     "start_line": ln,
                     "end_line": end,
-                    "snippet_sha1": _sha1_text(src),
+                    "snippet_sha1": src_sha1,
                     "snippet_len_chars": len(src),
                 }
             )
 
-        # --- Existing behavior: capture relevant top-level blocks ---
-        blocks: List[str] = []
-        block_meta: List[Dict[str, Any]] = []
-
-        for node in tree.body:
-            if _is_top_level_block(node) and _node_uses_any_name(node, imported_names):
-                src = _source_for_node(text, node)
-                if not src:
-                    continue
-
-                ln = getattr(node, "lineno", None)
-                end = getattr(node, "end_lineno", None)
-                if not (isinstance(ln, int) and isinstance(end, int) and end >= ln):
-                    ln, end = _lineno_span_fallback(text, src)
-
-                blocks.append(src)
-                block_meta.append(
-                    {
-                        "snippet_kind": "py_top_level_block",
-                        "node_kind": type(node).__name__,
-                        "start_line": ln,
-                        "end_line": end,
-                        "snippet_sha1": _sha1_text(src),
-                        "snippet_len_chars": len(src),
-                    }
-                )
-
-        # If nothing to write, skip
-        if not import_stmts and not blocks:
-            skipped_no_output += 1
-            continue
-
-        src_rel: Path = f["rel_path"]
-        rel_md = src_rel.with_suffix(src_rel.suffix + ".md")
-
-        parts: List[str] = []
-        if import_stmts:
-            parts.append("\n".join(import_stmts).rstrip())
-        if blocks:
-            parts.append("\n\n".join(blocks).rstrip())
-        content = "\n\n".join([p for p in parts if p]).rstrip() + "\n"
-
-        meta = _base_meta(
-            run_id=run_id,
-            kind="py",
-            source_rel=src_rel.as_posix(),
-            mirror_rel=rel_md.as_posix(),
-            file_info=_file_info_from_cache(f),
-            extractor={
-                "name": "mirror_builder",
-                "phase": "layer4_mirror",
-                "rule": "ring0_textual_imports_used_plus_blocks",
-            },
-        )
-        meta["textual_imports"] = sorted(imported_names)
-
-        meta["imports"] = {
-            "count": len(import_stmts),
-            "snippets": import_meta,
-        }
-        meta["blocks"] = {
-            "count": len(blocks),
-            "snippets": block_meta,
-        }
+    # If nothing to write, skip
+    if not import_stmts and not blocks:
+        return "no_output", None
+
+    src_rel: Path = f["rel_path"]
+    rel_md = src_rel.with_suffix(src_rel.suffix + ".md")
+
+    parts: List[str] = []
+    if import_stmts:
+        parts.append("\n".join(import_stmts).rstrip())
+    if blocks:
+        parts.append("\n\n".join(blocks).rstrip())
+    content = "\n\n".join([p for p in parts if p]).rstrip() + "\n"
+
+    meta = _base_meta(
+        run_id=run_id,
+        kind="py",
+        source_rel=src_rel.as_posix(),
+        mirror_rel=rel_md.as_posix(),
+        file_info=_file_info_from_cache(f),
+        extractor={
+            "name": "mirror_builder",
+            "phase": "layer4_mirror",
+            "rule": "ring0_textual_imports_used_plus_blocks",
+        },
+    )
+    meta["textual_imports"] = sorted(imported_names)
 
-        meta["imports_count"] = len(import_stmts)
-        meta["blocks_count"] = len(blocks)
+    meta["imports"] = {
+        "count": len(import_stmts),
+        "snippets": import_meta,
+    }
+    meta["blocks"] = {
+        "count": len(blocks),
+        "snippets": block_meta,
+    }
 
-        meta["snippets"] = import_meta + block_meta
-        meta["mirror_sha1"] = _sha1_text(content)
-        meta["mirror_len_chars"] = len(content)
+    meta["imports_count"] = len(import_stmts)
+    meta["blocks_count"] = len(blocks)
+
+    meta["snippets"] = import_meta + block_meta
+    meta["mirror_sha1"] = _sha1_text(content)
+    meta["mirror_len_chars"] = len(content)
+
+    key = src_rel.as_posix()
+    cache_entry = {
+        "kind": "py",
+        "source_rel": key,
+        "mirror_rel": rel_md.as_posix(),
+        "content": content,
+        "textual_imports": sorted(imported_names),
+        "imports_count": len(import_stmts),
+        "blocks_count": len(blocks),
+        "meta_rel": (rel_md.as_posix() + ".meta.json"),
+    }
 
-        write_mirror_with_meta(mirror_root, rel_md, content, meta)
-        written_py += 1
+    return "ok", (rel_md, content, meta, cache_entry)
 
-        key = src_rel.as_posix()
-        mirror_cache[key] = {
-            "kind": "py",
-            "source_rel": key,
-            "mirror_rel": rel_md.as_posix(),
-            "content": content,
-            "textual_imports": sorted(imported_names),
-            "imports_count": len(import_stmts),
-            "blocks_count": len(blocks),
-            "meta_rel": (rel_md.as_posix() + ".meta.json"),
-        }
 
-    log(
-        "done  "
-        f"mirrors_written={len(mirror_cache)}  "
-        f"(tcss={len(tcss_files)} py={written_py})  "
-        f"ring0_py_no_output={skipped_no_output}  "
-        f"py_parse_errors={parse_errors}"
-    )
+def _build_py_mirrors(py_files: List[Dict[str, Any]], run_id: str) -> List[Tuple[str, Optional[PyMirror]]]:
+    """
+    _build_py_mirror for every file, in input order.
+    Files are independent and parse-bound, so PARALLEL_MIRROR_MIN_FILES or more go through a
+    process pool; serial otherwise, or when a pool cannot be started here.
+    """
+    jobs = [(f, run_id) for f in py_files]
+    if len(jobs) >= PARALLEL_MIRROR_MIN_FILES:
+        workers = os.cpu_count() or 1
+        chunksize = max(1, len(jobs) // (4 * workers))
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                return list(ex.map(_build_py_mirror, jobs, chunksize=chunksize))
+        except (OSError, BrokenProcessPool):
+            pass
+    return [_build_py_mirror(job) for job in jobs]
 
-    return mirror_cache
 
 # ----------------------------
 # AST helpers
@@ -273,14 +328,19 @@ def _collect_textual_imported_names(tree: ast.AST) -> Set[str]:
     """
     names: Set[str] = set()
     for node in ast.walk(tree):
-        if isinstance(node, ast.ImportFrom):
-            mod = node.module or ""
-            if mod == "textual" or mod.startswith("textual."):
-                for alias in node.names:
-                    names.add(alias.asname or alias.name)
+        if isinstance(node, ast.ImportFrom) and _is_textual_module(node.module):
+            for alias in node.names:
+                names.add(alias.asname or alias.name)
     return names
 
 
+def _is_textual_module(mod: Optional[str]) -> bool:
+    """
+    True for "textual" and its submodules; ImportFrom.module is None for "from . import x".
+    """
+    return mod is not None and (mod == "textual" or mod.startswith("textual."))
+
+
 def _is_top_level_block(node: ast.AST) -> bool:
     """
     What we consider "carry-over-able" in Ring0 mirrors:
@@ -291,14 +351,27 @@ def _is_top_level_block(node: ast.AST) -> bool:
     return isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef, ast.Assign, ast.AnnAssign))
 
 
-def _node_uses_any_name(node: ast.AST, names: Set[str]) -> bool:
+def _scan_name_ids(tree: ast.Module) -> Tuple[Set[str], Dict[int, Set[str]]]:
     """
-    True if node's subtree references any of the given names as a Name identifier.
+    One walk over each top-level statement, returning:
+      - Load-context Name ids anywhere in the module
+      - for each top-level block (see _is_top_level_block), every Name id in its subtree, keyed by id(node)
+    Import statements bind aliases, not Name nodes, so they are not walked.
     """
-    for sub in ast.walk(node):
-        if isinstance(sub, ast.Name) and sub.id in names:
-            return True
-    return False
+    used: Set[str] = set()
+    block_names: Dict[int, Set[str]] = {}
+    for stmt in tree.body:
+        if isinstance(stmt, (ast.Import, ast.ImportFrom)):
+            continue
+        names: Set[str] = set()
+        for sub in ast.walk(stmt):
+            if isinstance(sub, ast.Name):
+                names.add(sub.id)
+                if isinstance(sub.ctx, ast.Load):
+                    used.add(sub.id)
+        if _is_top_level_block(stmt):
+            block_names[id(stmt)] = names
+    return used, block_names
 
 
 def _source_for_node(text: str, node: ast.AST) -> str:
@@ -318,6 +391,41 @@ def _source_for_node(text: str, node: ast.AST) -> str:
     return ""
 
 
+# Same line breaks as ast.get_source_segment: \r\n, \r, \n (not \f)
+_LINE_BREAK_RE = re.compile(rb"\r\n|\r|\n")
+
+
+def _line_offsets(src_bytes: bytes) -> List[int]:
+    """
+    Byte offset of the start of each line in src_bytes (index 0 = line 1).
+    """
+    return [0] + [m.end() for m in _LINE_BREAK_RE.finditer(src_bytes)]
+
+
+def _snippet_for_node(text: str, src_bytes: bytes, offs: List[int], node: ast.AST) -> Tuple[str, str]:
+    """
+    (_source_for_node(text, node), its _sha1_text) without re-splitting text per node: AST columns
+    are UTF-8 byte offsets, so the segment is one slice of the encoded text (src_bytes, with offs
+    from _line_offsets), and the sha1 is taken on that slice instead of re-encoding the snippet.
+    Falls back to _source_for_node when location info is missing or out of range.
+    """
+    ln = getattr(node, "lineno", None)
+    end_ln = getattr(node, "end_lineno", None)
+    col = getattr(node, "col_offset", None)
+    end_col = getattr(node, "end_col_offset", None)
+    if not (
+        isinstance(ln, int)
+        and isinstance(end_ln, int)
+        and isinstance(col, int)
+        and isinstance(end_col, int)
+        and 0 < ln <= end_ln <= len(offs)
+    ):
+        src = _source_for_node(text, node)
+        return src, _sha1_text(src)
+    seg = src_bytes[offs[ln - 1] + col : offs[end_ln - 1] + end_col]
+    return seg.decode("utf-8"), hashlib.sha1(seg).hexdigest()
+
+
 def _lineno_span_fallback(full_text: str, snippet_text: str) -> Tuple[int, int]:
     """
     Best-effort fallback for line span if AST doesn't provide lineno/end_lineno.
@@ -336,6 +444,10 @@ def _lineno_span_fallback(full_text: str, snippet_text: str) -> Tuple[int, int]:
 # IO helpers
 # ----------------------------
 
+# Mirror dirs already created by this process; mirrors share few dirs, so most writes skip the mkdir.
+_ensured_dirs: Set[str] = set()
+
+
 def write_mirror_with_meta(mirror_root: Path, rel_path: Path, content: str, meta: Dict[str, Any]) -> None:
     """
     Write:
@@ -343,11 +455,22 @@ def write_mirror_with_meta(mirror_root: Path, rel_path: Path, content: str, meta
       - metadata json to <rel_path>.meta.json
     """
     out_path = mirror_root / rel_path
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_path.write_text(content, encoding="utf-8")
+    parent = str(out_path.parent)
+    if parent not in _ensured_dirs:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        _ensured_dirs.add(parent)
+    try:
+        out_path.write_text(content, encoding="utf-8")
+    except FileNotFoundError:
+        # dir removed since it was cached
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(content, encoding="utf-8")
 
     meta_path = Path(str(out_path) + ".meta.json")
-    meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    if orjson is not None:
+        meta_path.write_bytes(orjson.dumps(meta, option=orjson.OPT_INDENT_2))
+    else:
+        meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
 
 
 def _base_meta(
@@ -47,13 +47,45 @@ Notes:
 
 from __future__ import annotations
 
+import gzip
 import json
+import mmap
 import os
+import re
 import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from repo_ui.layer3_aggregates import (
+    AGGREGATE_KEYS,
+    AGGREGATES_CONTRACT,
+    AGGREGATES_REL,
+    WAL_COMPACT_AT,
+    fold_contribution,
+    read_wal,
+    replay_wal,
+    tile_contribution,
+    truncate_wal,
+)
+
+try:
+    # Optional: C decoder for tiles / index / scope reads (same objects as json.loads).
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None  # type: ignore[assignment]
+
+try:
+    # Optional: streaming parser, so `show file` on a large tile only materializes what it prints.
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:  # pragma: no cover - full-parse fallback
+    ijson = None  # type: ignore[assignment]
 
 
 # -----------------------------
@@ -70,6 +102,23 @@ DEFAULT_TILE_SUFFIX = ".layer3.json"
 DEFAULT_CSS_INDEX_REL = "shadow_ui/layer4/mirror/css_index.json"
 DEFAULT_DISPLAY_LIMIT = 50
 
+# Per-directory tile listings reused across invocations while a directory's mtime is unchanged
+TILE_LISTING_CACHE_REL = Path("shadow_ui/layer3/.tile_listing.cache.json")
+TILE_LISTING_CACHE_CONTRACT = "repo_ui_tile_listing_v1"  # bump when the entry shape changes
+# Directories modified this recently are listed but not cached: a later change within the same
+# mtime tick (coarse filesystem clocks) would otherwise go unnoticed.
+TILE_LISTING_RACY_NS = 2_000_000_000
+
+# Tile reads kept in flight per worker by _iter_tile_payloads (bounds memory and wasted work on early exit)
+TILE_READ_AHEAD_PER_WORKER = 4
+
+# `show file` streams tiles at least this large (when ijson is installed); smaller ones are parsed whole
+SHOW_FILE_STREAM_MIN_BYTES = 1_000_000
+
+# Parsed tiles kept for the rest of the invocation (LRU), capped by count and by summed on-disk size
+TILE_CACHE_MAX_TILES = 256
+TILE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
 
 # -----------------------------
 # Command registry (authoritative for help/tree)
@@ -120,6 +169,8 @@ REGISTRY: Dict[str, Any] = {
                 ("--file <repo_rel_path>", "Restrict to a single file tile when supported."),
                 ("--show-locs", "Expand summaries into occurrences."),
                 ("--meta", "Include provenance (anchor_ref + focus original lines) when showing occurrences."),
+                ("--serial", "Read tiles one at a time on the main thread (no read-ahead thread pool)."),
+                ("--fresh", "Rebuild shadow_ui/layer3/aggregates.json from every tile instead of updating it."),
             ],
             "examples": [
                 "python -m repo_ui.query list ids",
@@ -203,6 +254,8 @@ REGISTRY: Dict[str, Any] = {
             "usage": "count <thing> [flags...]",
             "params": [
                 ("--file <repo_rel_path>", "Restrict to a single file tile when supported."),
+                ("--serial", "Read tiles one at a time on the main thread (no read-ahead thread pool)."),
+                ("--fresh", "Rebuild shadow_ui/layer3/aggregates.json from every tile instead of updating it."),
             ],
             "examples": [
                 "python -m repo_ui.query count ids --type Static",
@@ -262,6 +315,13 @@ def _repo_root_from_cwd() -> str:
 
 
 def _read_json(path: Path) -> Dict[str, Any]:
+    if orjson is not None:
+        data = path.read_bytes()
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects invalid UTF-8; decode with replacement as the stdlib path does
+            return json.loads(data.decode("utf-8", errors="replace"))
     return json.loads(path.read_text(encoding="utf-8", errors="replace"))
 
 
@@ -297,6 +357,7 @@ def _merge_scope(g: Dict[str, Any], u: Dict[str, Any]) -> Dict[str, Any]:
       - tiles_roots: start with generated.tiles_roots, then add tiles_roots_add, then remove tiles_roots_remove
       - tile_suffix: user overrides if non-null
       - default_limit: user overrides if present
+      - mmap_tiles: user overrides if present (default off)
     """
     eff: Dict[str, Any] = {}
     eff["contract"] = "repo_ui_scope_effective_v1"
@@ -340,6 +401,7 @@ def _merge_scope(g: Dict[str, Any], u: Dict[str, Any]) -> Dict[str, Any]:
     eff["display"] = {
         "default_limit": int(default_limit),
         "packet": bool(udisp.get("packet", gdisp.get("packet", True))),
+        "mmap_tiles": bool(udisp.get("mmap_tiles", gdisp.get("mmap_tiles", False))),
     }
     eff["layer3_contracts"] = g.get("layer3_contracts")
     return eff
@@ -373,22 +435,132 @@ def _load_scope(repo_root: str) -> ScopeBundle:
 def _iter_tiles(repo_root: str, scope: Dict[str, Any]) -> Iterable[Tuple[str, Path]]:
     """
     Iterate over all tiles under effective tiles_roots.
-    Yields (tile_rel_to_repo_root, tile_abs_path).
+    Yields (tile_rel_to_repo_root, tile_abs_path), in os.walk (top-down) order.
+
+    Directory listings come from TILE_LISTING_CACHE_REL when the directory's mtime_ns is unchanged
+    (adding, removing or renaming an entry bumps it), so an unchanged tree costs one stat per
+    directory. The cache is rewritten once the iterator is exhausted, if anything was re-listed.
     """
     rr = Path(repo_root)
     l3 = scope.get("layer3") or {}
     roots = l3.get("tiles_roots") or []
     suffix = str(l3.get("tile_suffix") or DEFAULT_TILE_SUFFIX)
+
+    cache_path = rr / TILE_LISTING_CACHE_REL
+    prev_roots = _load_tile_listing_cache(cache_path)
+    next_roots: Dict[str, Dict[str, Any]] = {}
+    changed = False
+    racy_after = time.time_ns() - TILE_LISTING_RACY_NS
+
     for r in roots:
-        base = rr / _norm_rel(str(r))
+        root_rel = _norm_rel(str(r))
+        base = rr / root_rel
         if not base.exists():
             continue
-        for dirpath, _dirnames, filenames in os.walk(base):
-            for fn in filenames:
-                if fn.endswith(suffix):
-                    p = Path(dirpath) / fn
-                    rel = _norm_rel(os.path.relpath(p, rr))
-                    yield rel, p
+        prev = prev_roots.get(root_rel) or {}
+        prev_dirs = prev.get("dirs") if prev.get("suffix") == suffix else None
+        if not isinstance(prev_dirs, dict):
+            prev_dirs = {}
+        dirs: Dict[str, Dict[str, Any]] = {}
+
+        # dir paths relative to base, "/"-joined ("" = base itself)
+        stack: List[str] = [""]
+        while stack:
+            d_rel = stack.pop()
+            d_path = os.path.join(str(base), *d_rel.split("/")) if d_rel else str(base)
+            try:
+                mtime_ns = os.stat(d_path).st_mtime_ns
+            except OSError:
+                continue
+            hit = prev_dirs.get(d_rel)
+            if isinstance(hit, dict) and hit.get("mtime_ns") == mtime_ns:
+                files, subdirs = hit["files"], hit["subdirs"]
+            else:
+                listed = _scan_tile_dir(d_path, suffix)
+                if listed is None:
+                    continue
+                files, subdirs = listed
+                changed = True
+            if mtime_ns < racy_after:
+                dirs[d_rel] = {"mtime_ns": mtime_ns, "files": files, "subdirs": subdirs}
+            else:
+                changed = True
+
+            for fn in files:
+                p = Path(d_path) / fn
+                rel = _norm_rel(os.path.relpath(p, rr))
+                yield rel, p
+            stack.extend(reversed([f"{d_rel}/{s}" if d_rel else s for s in subdirs]))
+
+        next_roots[root_rel] = {"suffix": suffix, "dirs": dirs}
+
+    if changed or next_roots.keys() != prev_roots.keys():
+        _write_tile_listing_cache(cache_path, next_roots)
+
+
+def _scan_tile_dir(d_path: str, suffix: str) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    One directory, as os.walk sees it: (names ending in suffix among non-directories,
+    directory names to descend into), both in scandir order. Symlinked dirs are not descended.
+    None if the directory cannot be listed.
+    """
+    files: List[str] = []
+    subdirs: List[str] = []
+    try:
+        with os.scandir(d_path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not entry.is_symlink():
+                        subdirs.append(entry.name)
+                elif entry.name.endswith(suffix):
+                    files.append(entry.name)
+    except OSError:
+        return None
+    return files, subdirs
+
+
+def _load_tile_listing_cache(path: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Best-effort load; a missing, corrupt, or stale-contract cache is treated as empty.
+    """
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("contract_version") != TILE_LISTING_CACHE_CONTRACT:
+        return {}
+    roots = data.get("roots")
+    return roots if isinstance(roots, dict) else {}
+
+
+def _write_tile_listing_cache(path: Path, roots: Dict[str, Dict[str, Any]]) -> None:
+    _write_cache_json(path, {"contract_version": TILE_LISTING_CACHE_CONTRACT, "roots": roots})
+
+
+def _write_cache_json(path: Path, payload: Dict[str, Any]) -> bool:
+    # tmp + rename; best-effort (a read-only checkout just rebuilds next time). False if not written.
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if orjson is not None:
+            tmp.write_bytes(orjson.dumps(payload))
+        else:
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        return False
+    return True
+
+
+def _drop_tile_listing_cache(repo_root: str) -> None:
+    try:
+        os.remove(Path(repo_root) / TILE_LISTING_CACHE_REL)
+    except OSError:
+        pass
 
 
 def _tile_path_for_file(repo_root: str, scope: Dict[str, Any], file_rel: str) -> Path:
@@ -418,6 +590,11 @@ def _load_css_index(repo_root: str) -> Tuple[Path, Dict[str, Any]]:
     rr = Path(repo_root)
     p = rr / _norm_rel(DEFAULT_CSS_INDEX_REL)
     if not p.exists():
+        # build_css_index(compress=True) writes <name>.gz instead
+        gz_path = p.with_name(p.name + ".gz")
+        if gz_path.exists():
+            with gzip.open(gz_path, "rt", encoding="utf-8", errors="replace") as fp:
+                return gz_path, json.load(fp)
         raise SystemExit(f"[repo_ui.query] missing css index: {p} (run: python -m repo_ui)")
     return p, _read_json(p)
 
@@ -665,6 +842,7 @@ def scope_add_tiles_root(repo_root: str, scope: ScopeBundle, path: str) -> None:
     if p not in add:
         add.append(p)
     _write_json(scope.user_path, u)
+    _drop_tile_listing_cache(repo_root)
     # Reload to show effective
     new_scope = _load_scope(repo_root)
     print(f"OK: added tiles-root: {p}")
@@ -679,6 +857,7 @@ def scope_remove_tiles_root(repo_root: str, scope: ScopeBundle, path: str) -> No
     if p not in rem:
         rem.append(p)
     _write_json(scope.user_path, u)
+    _drop_tile_listing_cache(repo_root)
     new_scope = _load_scope(repo_root)
     print(f"OK: removed tiles-root (by overlay removal): {p}")
     scope_print(repo_root, new_scope)
@@ -726,8 +905,196 @@ def _warn_cwd_differs(repo_root: str, scope: ScopeBundle) -> Optional[str]:
     return None
 
 
+# Set by main() from scope.display.mmap_tiles.
+_mmap_tiles = False
+
+
+def _read_json_mapped(path: Path) -> Dict[str, Any]:
+    """
+    _read_json via a read-only mmap: orjson parses the mapped pages directly, so the file is never
+    copied into a bytes object. Falls back to _read_json without orjson, for empty files, or when
+    orjson rejects the contents.
+    """
+    if orjson is None:
+        return _read_json(path)
+    try:
+        with open(path, "rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as mv:
+                return orjson.loads(mv)
+    except (ValueError, OSError):
+        # ValueError: empty file (cannot map) or orjson.JSONDecodeError
+        return _read_json(path)
+
+
 def _read_tile(p: Path) -> Dict[str, Any]:
-    return _read_json(p)
+    return _read_tile_cached(os.path.abspath(p))
+
+
+# abs path -> (tile, file size); guarded by _tile_cache_lock (tiles are read from the read-ahead pool)
+_tile_cache: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+_tile_cache_bytes = 0
+_tile_cache_lock = threading.Lock()
+
+
+def _read_tile_cached(abs_path: str) -> Dict[str, Any]:
+    """
+    Parsed tile, shared by every read of abs_path in this invocation (tiles do not change while a
+    command runs, and callers only read them). Least recently used tiles are evicted past
+    TILE_CACHE_MAX_TILES / TILE_CACHE_MAX_BYTES; a tile larger than the byte cap is not kept.
+    """
+    global _tile_cache_bytes
+    with _tile_cache_lock:
+        hit = _tile_cache.get(abs_path)
+        if hit is not None:
+            _tile_cache.move_to_end(abs_path)
+            return hit[0]
+
+    p = Path(abs_path)
+    tile = _read_json_mapped(p) if _mmap_tiles else _read_json(p)
+    try:
+        size = os.path.getsize(abs_path)
+    except OSError:
+        return tile
+    if size > TILE_CACHE_MAX_BYTES:
+        return tile
+
+    with _tile_cache_lock:
+        if abs_path not in _tile_cache:
+            _tile_cache[abs_path] = (tile, size)
+            _tile_cache_bytes += size
+            while len(_tile_cache) > TILE_CACHE_MAX_TILES or _tile_cache_bytes > TILE_CACHE_MAX_BYTES:
+                _evicted, (_t, evicted_size) = _tile_cache.popitem(last=False)
+                _tile_cache_bytes -= evicted_size
+    return tile
+
+
+# Set by main() from --serial.
+_serial_tiles = False
+
+
+def _iter_tile_payloads(
+    repo_root: str,
+    scope: Dict[str, Any],
+    prefilter: Optional[Callable[[Path], bool]] = None,
+) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """
+    (tile_rel, tile) for every tile, in _iter_tiles order.
+    With a prefilter (see _tile_prefilter), tiles it rejects are skipped without being parsed.
+    """
+    return _read_tiles_ahead(_iter_tiles(repo_root, scope), prefilter)
+
+
+def _scan_tiles(
+    repo_root: str,
+    scope: Dict[str, Any],
+    tiles: Optional[List[Tuple[str, Path]]],
+    prefilter: Optional[Callable[[Path], bool]] = None,
+) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    # The given (tile_rel, path) subset (e.g. from _aggregate_tiles), or every tile when None
+    if tiles is None:
+        return _iter_tile_payloads(repo_root, scope, prefilter)
+    return _read_tiles_ahead(tiles, prefilter)
+
+
+def _read_tiles_ahead(
+    tiles: Iterable[Tuple[str, Path]],
+    prefilter: Optional[Callable[[Path], bool]] = None,
+) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """
+    (tile_rel, tile) for each (tile_rel, path) that passes prefilter, in input order.
+    Tiles are parsed ahead by a thread pool (at most TILE_READ_AHEAD_PER_WORKER reads per worker in flight);
+    reads not yet started are cancelled when the caller stops early. --serial reads inline.
+    """
+    workers = os.cpu_count() or 1
+    if _serial_tiles or workers <= 1:
+        for tile_rel, p in tiles:
+            tile = _read_tile_passing(p, prefilter)
+            if tile is not None:
+                yield tile_rel, tile
+        return
+
+    ahead = workers * TILE_READ_AHEAD_PER_WORKER
+    pending: Deque[Tuple[str, Future]] = deque()
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        try:
+            for tile_rel, p in tiles:
+                pending.append((tile_rel, ex.submit(_read_tile_passing, p, prefilter)))
+                if len(pending) >= ahead:
+                    done_rel, fut = pending.popleft()
+                    tile = fut.result()
+                    if tile is not None:
+                        yield done_rel, tile
+            while pending:
+                done_rel, fut = pending.popleft()
+                tile = fut.result()
+                if tile is not None:
+                    yield done_rel, tile
+        finally:
+            for _rel, fut in pending:
+                fut.cancel()
+
+
+def _read_tile_passing(p: Path, prefilter: Optional[Callable[[Path], bool]]) -> Optional[Dict[str, Any]]:
+    if prefilter is not None and not prefilter(p):
+        return None
+    return _read_tile(p)
+
+
+# Non-ASCII characters whose str.lower() starts with this ASCII letter, as raw UTF-8 and as a \u escape
+_LOWER_TO_ASCII_RAW: Dict[str, Tuple[bytes, ...]] = {
+    "k": (b"\xe2\x84\xaa", b"\\u212a"),  # KELVIN SIGN
+    "i": (b"\xc4\xb0", b"\\u0130"),  # LATIN CAPITAL LETTER I WITH DOT ABOVE
+}
+
+
+def _raw_needle(text: str) -> Optional[bytes]:
+    """
+    text as it appears verbatim inside a JSON string written by json/orjson, or None when an
+    encoder may escape part of it (non-ASCII, quotes, backslashes, '/', control characters).
+    """
+    if not text or not text.isascii() or any(c in '"\\/' or c < " " for c in text):
+        return None
+    return text.encode("ascii")
+
+
+def _tile_may_contain(p: Path, needles: Sequence[bytes], ignore_case: bool = False) -> bool:
+    """
+    True if any needle occurs in the raw tile bytes (ASCII case-insensitively with ignore_case).
+    The file is mapped, not read. Also True when it cannot be mapped (empty / unreadable), so the
+    parse that follows reports it as before.
+    """
+    try:
+        with open(p, "rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if ignore_case:
+                rx = re.compile(b"|".join(re.escape(n) for n in needles), re.IGNORECASE)
+                return rx.search(mm) is not None
+            return any(mm.find(n) != -1 for n in needles)
+    except (OSError, ValueError):
+        return True
+
+
+def _tile_prefilter(file_filter: Optional[str] = None, contains_l: Optional[str] = None) -> Optional[Callable[[Path], bool]]:
+    """
+    Raw-bytes test for tile scans (filter before parse), or None when nothing can be tested.
+    Conservative: a tile is only rejected when, once parsed, it could not pass --file (its
+    source_rel must end with the file's basename) or match --contains (lowercased substring).
+    """
+    checks: List[Tuple[List[bytes], bool]] = []
+    if file_filter:
+        base = _raw_needle(_norm_rel(file_filter).rsplit("/", 1)[-1])
+        if base:
+            checks.append(([base], False))
+    if contains_l:
+        needle = _raw_needle(contains_l)
+        if needle:
+            needles = [needle]
+            for ch, raws in _LOWER_TO_ASCII_RAW.items():
+                if ch in contains_l:
+                    needles.extend(raws)
+            checks.append((needles, True))
+    if not checks:
+        return None
+    return lambda p: all(_tile_may_contain(p, needles, ignore_case) for needles, ignore_case in checks)
 
 
 def _file_filter_match(tile: Dict[str, Any], want_file: Optional[str]) -> bool:
@@ -736,6 +1103,120 @@ def _file_filter_match(tile: Dict[str, Any], want_file: Optional[str]) -> bool:
     src = (tile.get("source") or {}).get("source_rel", "")
     return _norm_rel(str(src)) == _norm_rel(want_file)
 
+# -----------------------------
+# Aggregates sidecar (AGGREGATES_REL)
+# -----------------------------
+
+# Set by main() from --fresh.
+_fresh_aggregates = False
+
+
+def _load_or_build_aggregates(repo_root: str, scope: Dict[str, Any], fresh: bool = False) -> Tuple[Path, Dict[str, Any]]:
+    """
+    Repo-wide histograms over all tiles, kept in AGGREGATES_REL.
+
+    Each tile's contribution is stored under per_tile[tile_rel] with the (mtime_ns, size) it was read at.
+    The pipeline's delta log (AGGREGATES_WAL_REL) is replayed over the snapshot first, so tiles it just
+    wrote already match their stat. Then only tiles that are new or whose stat changed are parsed; their
+    old contribution is subtracted from totals and the new one added, and tiles that disappeared are
+    subtracted. fresh=True (--fresh) ignores snapshot and log and rebuilds from every tile.
+    The snapshot is rewritten (and the log truncated) when a tile had to be re-read or dropped, or once
+    more than WAL_COMPACT_AT log lines were replayed.
+    """
+    rr = Path(repo_root)
+    path = rr / AGGREGATES_REL
+    prev: Dict[str, Any] = {}
+    if not fresh:
+        try:
+            prev = _read_json(path)
+        except (OSError, ValueError):
+            prev = {}
+        if not isinstance(prev, dict) or prev.get("contract_version") != AGGREGATES_CONTRACT:
+            prev = {}
+
+    prev_tiles: Dict[str, Any] = dict(prev.get("per_tile") or {})
+    totals: Dict[str, Dict[str, int]] = {key: dict((prev.get("totals") or {}).get(key) or {}) for key in AGGREGATE_KEYS}
+    racy_after = time.time_ns() - TILE_LISTING_RACY_NS
+
+    wal = [] if fresh else read_wal(rr)
+    replay_wal(totals, prev_tiles, wal, racy_after)
+
+    per_tile: Dict[str, Any] = {}
+    stale: List[Tuple[str, Path]] = []
+    stats: Dict[str, Tuple[int, int]] = {}
+    for tile_rel, p in _iter_tiles(repo_root, scope):
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        stats[tile_rel] = (st.st_mtime_ns, st.st_size)
+        old = prev_tiles.get(tile_rel)
+        if isinstance(old, dict) and old.get("mtime_ns") == st.st_mtime_ns and old.get("size") == st.st_size:
+            per_tile[tile_rel] = old
+        else:
+            stale.append((tile_rel, p))
+
+    gone = [rel for rel in prev_tiles if rel not in stats]
+    for rel in gone + [rel for rel, _p in stale]:
+        old = prev_tiles.get(rel)
+        if isinstance(old, dict):
+            fold_contribution(totals, old, -1)
+
+    for tile_rel, tile in _read_tiles_ahead(stale):
+        contrib = tile_contribution(tile)
+        fold_contribution(totals, contrib, +1)
+        mtime_ns, size = stats[tile_rel]
+        # A tile rewritten within the same mtime tick would look unchanged; re-read it next time.
+        contrib["mtime_ns"] = mtime_ns if mtime_ns < racy_after else -1
+        contrib["size"] = size
+        per_tile[tile_rel] = contrib
+
+    per_tile = {rel: per_tile[rel] for rel in stats if rel in per_tile}  # scan order, for _aggregate_tiles
+    payload = {
+        "contract_version": AGGREGATES_CONTRACT,
+        "generated_at": prev.get("generated_at"),
+        "totals": totals,
+        "per_tile": per_tile,
+    }
+    if stale or gone or not prev or len(wal) > WAL_COMPACT_AT:
+        _compact_wal(rr, payload)
+    return path, payload
+
+
+def _compact_wal(repo_root: Path, payload: Dict[str, Any]) -> None:
+    # Snapshot first, then drop the log it now contains (a crash in between only replays idempotent upserts)
+    payload["generated_at"] = _now()
+    if _write_cache_json(repo_root / AGGREGATES_REL, payload):
+        truncate_wal(repo_root)
+
+
+def _aggregate_tiles(repo_root: str, agg: Dict[str, Any], key: str, value: str) -> List[Tuple[str, Path]]:
+    """
+    (tile_rel, path) of the tiles whose per_tile[key] histogram has value, in _iter_tiles order.
+    per_tile doubles as an inverted index: a --type scan only opens tiles that have the type.
+    """
+    rr = Path(repo_root)
+    return [
+        (rel, rr / rel)
+        for rel, contrib in (agg.get("per_tile") or {}).items()
+        if isinstance(contrib, dict) and value in (contrib.get(key) or {})
+    ]
+
+
+def _aggregate_view(agg: Dict[str, Any], file_filter: Optional[str]) -> Dict[str, Dict[str, int]]:
+    """
+    Repo totals, or (with --file) the histograms of the tile(s) for that source file.
+    """
+    if not file_filter:
+        return agg.get("totals") or {}
+    want = _norm_rel(file_filter)
+    view: Dict[str, Dict[str, int]] = {key: {} for key in AGGREGATE_KEYS}
+    for contrib in (agg.get("per_tile") or {}).values():
+        if isinstance(contrib, dict) and contrib.get("source_rel") == want:
+            fold_contribution(view, contrib, +1)
+    return view
+
+
 def _print_css_refs(refs: List[Dict[str, Any]], limit: int) -> None:
     refs = refs[: max(0, int(limit))]
     if not refs:
@@ -935,6 +1416,31 @@ def list_ids(
     contains_l = (contains or "").lower().strip()
     want_type = (want_type or "").strip() or None
 
+    # Frequency of unique ids, no type filter: served from the aggregates. Only with --meta: without it
+    # the id_index fast path below answers (alphabetical, no counts), whatever the sort key.
+    if sort_key == "count" and meta and not want_type and not show_locs:
+        agg_path, agg = _load_or_build_aggregates(repo_root, eff, _fresh_aggregates)
+        sources.append(_norm_rel(str(agg_path.relative_to(repo_root))))
+        freq_items = [
+            (idv, c)
+            for idv, c in (_aggregate_view(agg, file_filter).get("ids") or {}).items()
+            if idv and (not contains_l or contains_l in idv.lower())
+        ]
+        freq_items.sort(key=lambda kv: (-kv[1], kv[0]))
+        freq_items = freq_items[:limit]
+
+        _print_packet_header(_repo_root_from_cwd(), _reconstruct_command_line(argv), sources, warnings)
+        print("# ids (unique, sorted by count)\n")
+        if not freq_items:
+            print("- (none)")
+        else:
+            for idv, c in freq_items:
+                print(f"- `{idv}` count={c}")
+        if meta:
+            print("\n(note) --meta has no per-item provenance in unique-only mode; use --show-locs.")
+        _print_packet_footer()
+        return
+
     # Fast path: unique ids, no type filter, no locations/meta needed
     if not want_type and not show_locs and not meta:
         id_index = idx.get("id_index") or {}
@@ -959,8 +1465,12 @@ def list_ids(
     hits: List[Tuple[str, str, str, str]] = []
     # (id_value, type, file, linekey)
 
-    for _tile_rel, p in _iter_tiles(repo_root, eff):
-        tile = _read_tile(p)
+    prefilter = _tile_prefilter(file_filter, contains_l)
+    type_tiles: Optional[List[Tuple[str, Path]]] = None
+    if want_type:
+        _agg_path, agg = _load_or_build_aggregates(repo_root, eff, _fresh_aggregates)
+        type_tiles = _aggregate_tiles(repo_root, agg, "types", want_type)
+    for _tile_rel, tile in _scan_tiles(repo_root, eff, type_tiles, prefilter):
         if file_filter and not _file_filter_match(tile, file_filter):
             continue
         src_file = _norm_rel(str((tile.get("source") or {}).get("source_rel", "") or ""))
@@ -1039,10 +1549,9 @@ def list_ids(
     # Keep it simple: rescan tiles but only print matching lines until limit reached.
     printed = 0
     cur_id: Optional[str] = None
-    for _tile_rel, p in _iter_tiles(repo_root, eff):
+    for _tile_rel, tile in _scan_tiles(repo_root, eff, type_tiles, prefilter):
         if printed >= limit:
             break
-        tile = _read_tile(p)
         if file_filter and not _file_filter_match(tile, file_filter):
             continue
         src_file = _norm_rel(str((tile.get("source") or {}).get("source_rel", "") or ""))
@@ -1093,26 +1602,12 @@ def list_types(
 
     eff = scope.effective
     sources = [_norm_rel(str((Path(repo_root) / eff["layer3"]["index_path"]).as_posix()))]
-    sources.append("shadow_ui/layer3/tiles/**")
+    agg_path, agg = _load_or_build_aggregates(repo_root, eff, _fresh_aggregates)
+    sources.append(_norm_rel(str(agg_path.relative_to(repo_root))))
 
-    counts: Dict[str, int] = {}
-    literal_ids: Dict[str, int] = {}
-
-    for _tile_rel, p in _iter_tiles(repo_root, eff):
-        tile = _read_tile(p)
-        if file_filter and not _file_filter_match(tile, file_filter):
-            continue
-        nodes = ((tile.get("pools") or {}).get("constructors") or {}).get("nodes") or []
-        for n in nodes:
-            if not isinstance(n, dict):
-                continue
-            t = str(n.get("type") or "")
-            if not t:
-                continue
-            counts[t] = counts.get(t, 0) + 1
-            id_obj = n.get("id") or {}
-            if isinstance(id_obj, dict) and id_obj.get("kind") == "literal":
-                literal_ids[t] = literal_ids.get(t, 0) + 1
+    view = _aggregate_view(agg, file_filter)
+    counts: Dict[str, int] = view.get("types") or {}
+    literal_ids: Dict[str, int] = view.get("literal_ids") or {}
 
     items = list(counts.items())
     if sort_key == "type":
@@ -1195,8 +1690,7 @@ def list_files(
 
     rows: List[Tuple[str, int, int, int, int]] = []
     # file, constructors, literal_ids, roots, edge_case_total
-    for _tile_rel, p in _iter_tiles(repo_root, eff):
-        tile = _read_tile(p)
+    for _tile_rel, tile in _iter_tile_payloads(repo_root, eff):
         src_file = _norm_rel(str((tile.get("source") or {}).get("source_rel", "") or ""))
         stats = tile.get("stats") or {}
         constructors = _maybe_int(stats.get("constructor_calls"), 0)
@@ -1280,10 +1774,9 @@ def list_edge_cases(
         print("\n# samples\n")
         sources.append("shadow_ui/layer3/tiles/**")
         found = 0
-        for _tile_rel, p in _iter_tiles(repo_root, eff):
+        for _tile_rel, tile in _iter_tile_payloads(repo_root, eff, _tile_prefilter(file_filter)):
             if found >= samples:
                 break
-            tile = _read_tile(p)
             if file_filter and not _file_filter_match(tile, file_filter):
                 continue
             src_file = _norm_rel(str((tile.get("source") or {}).get("source_rel", "") or ""))
@@ -1336,25 +1829,36 @@ def count_ids(
 
     uniq: set[str] = set()
     occ = 0
-    for _tile_rel, p in _iter_tiles(repo_root, eff):
-        tile = _read_tile(p)
-        if file_filter and not _file_filter_match(tile, file_filter):
-            continue
-        nodes = ((tile.get("pools") or {}).get("constructors") or {}).get("nodes") or []
-        for n in nodes:
-            if not isinstance(n, dict):
-                continue
-            typ = str(n.get("type") or "")
-            if want_type and typ != want_type:
-                continue
-            id_obj = n.get("id") or {}
-            if not isinstance(id_obj, dict) or id_obj.get("kind") != "literal":
-                continue
-            idv = str(id_obj.get("value") or "")
+    if not want_type:
+        # ids are not split by type in the aggregates; --type still scans tiles
+        agg_path, agg = _load_or_build_aggregates(repo_root, eff, _fresh_aggregates)
+        sources = [_norm_rel(str(agg_path.relative_to(repo_root)))]
+        for idv, c in (_aggregate_view(agg, file_filter).get("ids") or {}).items():
             if contains_l and contains_l not in idv.lower():
                 continue
             uniq.add(idv)
-            occ += 1
+            occ += c
+    else:
+        _agg_path, agg = _load_or_build_aggregates(repo_root, eff, _fresh_aggregates)
+        type_tiles = _aggregate_tiles(repo_root, agg, "types", want_type)
+        for _tile_rel, tile in _read_tiles_ahead(type_tiles, _tile_prefilter(file_filter, contains_l)):
+            if file_filter and not _file_filter_match(tile, file_filter):
+                continue
+            nodes = ((tile.get("pools") or {}).get("constructors") or {}).get("nodes") or []
+            for n in nodes:
+                if not isinstance(n, dict):
+                    continue
+                typ = str(n.get("type") or "")
+                if typ != want_type:
+                    continue
+                id_obj = n.get("id") or {}
+                if not isinstance(id_obj, dict) or id_obj.get("kind") != "literal":
+                    continue
+                idv = str(id_obj.get("value") or "")
+                if contains_l and contains_l not in idv.lower():
+                    continue
+                uniq.add(idv)
+                occ += 1
 
     _print_packet_header(_repo_root_from_cwd(), _reconstruct_command_line(argv), sources, warnings)
     print("# count ids\n")
@@ -1374,21 +1878,10 @@ def count_types(
         warnings.append(w)
 
     eff = scope.effective
-    sources = ["shadow_ui/layer3/tiles/**"]
+    agg_path, agg = _load_or_build_aggregates(repo_root, eff, _fresh_aggregates)
+    sources = [_norm_rel(str(agg_path.relative_to(repo_root)))]
 
-    counts: Dict[str, int] = {}
-    for _tile_rel, p in _iter_tiles(repo_root, eff):
-        tile = _read_tile(p)
-        if file_filter and not _file_filter_match(tile, file_filter):
-            continue
-        nodes = ((tile.get("pools") or {}).get("constructors") or {}).get("nodes") or []
-        for n in nodes:
-            if not isinstance(n, dict):
-                continue
-            t = str(n.get("type") or "")
-            if not t:
-                continue
-            counts[t] = counts.get(t, 0) + 1
+    counts: Dict[str, int] = _aggregate_view(agg, file_filter).get("types") or {}
 
     _print_packet_header(_repo_root_from_cwd(), _reconstruct_command_line(argv), sources, warnings)
     print("# count types\n")
@@ -1433,6 +1926,84 @@ def count_edge_cases(
     _print_packet_footer()
 
 
+def _read_show_tile(p: Path, limit: int, show_locs: bool, meta_refs: bool) -> Dict[str, Any]:
+    """
+    The tile for show_file: streamed with ijson when installed and the file is at least
+    SHOW_FILE_STREAM_MIN_BYTES, otherwise (or if streaming fails) the regular _read_tile.
+    """
+    if ijson is not None:
+        try:
+            big = os.path.getsize(p) >= SHOW_FILE_STREAM_MIN_BYTES
+        except OSError:
+            big = False
+        if big:
+            try:
+                return _stream_show_tile(p, limit, show_locs, meta_refs)
+            except (ijson.JSONError, ValueError, OSError):
+                pass
+    return _read_tile(p)
+
+
+def _stream_show_tile(p: Path, limit: int, show_locs: bool, meta_refs: bool) -> Dict[str, Any]:
+    """
+    A tile with only the members show_file prints, in the same shape: source, dialect, stats,
+    indexes.ids_by_value, edge_cases.buckets, meta_refs.snippets (with --meta-refs), the first
+    `limit` hash items and (with --show-locs) the first `limit` nodes that have a literal id.
+    Edges, roots, trees and every other node are tokenized but never built.
+    """
+    whole = {"source", "dialect", "stats", "indexes.ids_by_value", "edge_cases.buckets"}
+    if meta_refs:
+        whole.add("meta_refs.snippets")
+    cap = max(0, int(limit))
+    picked: Dict[str, Any] = {}
+    hash_items: List[Any] = []
+    nodes: List[Any] = []
+
+    with open(p, "rb") as fp:
+        events = ijson.parse(fp, use_float=True)
+        for prefix, event, value in events:
+            if event == "map_key" or event.startswith("end_"):
+                continue
+            if prefix in whole:
+                picked[prefix] = _build_streamed_value(event, value, events)
+            elif prefix == "pools.hashes.items.item" and len(hash_items) < max(cap, 1):
+                # one item even at --limit 0: show_file prints the (empty) hashes section iff the tile has any
+                hash_items.append(_build_streamed_value(event, value, events))
+            elif prefix == "pools.constructors.nodes.item" and show_locs and len(nodes) < cap:
+                n = _build_streamed_value(event, value, events)
+                id_obj = n.get("id") if isinstance(n, dict) else None
+                if isinstance(id_obj, dict) and id_obj.get("kind") == "literal" and id_obj.get("value"):
+                    nodes.append(n)
+
+    return {
+        "source": picked.get("source"),
+        "dialect": picked.get("dialect"),
+        "stats": picked.get("stats"),
+        "meta_refs": {"snippets": picked.get("meta_refs.snippets")},
+        "pools": {"hashes": {"items": hash_items}, "constructors": {"nodes": nodes}},
+        "indexes": {"ids_by_value": picked.get("indexes.ids_by_value")},
+        "edge_cases": {"buckets": picked.get("edge_cases.buckets")},
+    }
+
+
+def _build_streamed_value(event: str, value: Any, events: Iterable[Tuple[str, str, Any]]) -> Any:
+    # The value that starts at (event, value), consuming its remaining events from `events`
+    if event not in ("start_map", "start_array"):
+        return value
+    builder = ObjectBuilder()
+    builder.event(event, value)
+    depth = 1
+    for _prefix, ev, val in events:
+        builder.event(ev, val)
+        if ev in ("start_map", "start_array"):
+            depth += 1
+        elif ev in ("end_map", "end_array"):
+            depth -= 1
+            if not depth:
+                break
+    return builder.value
+
+
 def show_file(
     repo_root: str,
     scope: ScopeBundle,
@@ -1452,7 +2023,7 @@ def show_file(
     tile_path = _tile_path_for_file(repo_root, eff, file_rel)
     sources = [_norm_rel(str(tile_path.relative_to(repo_root)))]
 
-    tile = _read_tile(tile_path)
+    tile = _read_show_tile(tile_path, limit, show_locs, meta_refs)
     src = tile.get("source") or {}
     stats = tile.get("stats") or {}
     dialect = tile.get("dialect") or {}
@@ -1585,7 +2156,8 @@ def find_hash(
         _print_packet_footer()
         return
 
-    # canonical requires opening a tile
+    # canonical requires opening a tile; tiles that do not contain the hash bytes are not parsed
+    hv_raw = _raw_needle(hv)
     canonical: Optional[str] = None
     if show_canonical:
         # open first available occurrence tile and locate canonical
@@ -1594,7 +2166,7 @@ def find_hash(
             if not tile_rel:
                 continue
             tp = Path(repo_root) / _norm_rel(str(tile_rel))
-            if tp.exists():
+            if tp.exists() and (hv_raw is None or _tile_may_contain(tp, [hv_raw])):
                 sources.append(_norm_rel(str(tp.relative_to(repo_root))))
                 tile = _read_tile(tp)
                 items = ((tile.get("pools") or {}).get("hashes") or {}).get("items") or []
@@ -1621,7 +2193,7 @@ def find_hash(
             if meta and o.get("tile_rel") and not show_canonical:
                 # best-effort: open just this tile until we find provenance for this root_id
                 tp = Path(repo_root) / _norm_rel(str(o.get("tile_rel")))
-                if tp.exists():
+                if tp.exists() and (hv_raw is None or _tile_may_contain(tp, [hv_raw])):
                     tile = _read_tile(tp)
                     items = ((tile.get("pools") or {}).get("hashes") or {}).get("items") or []
                     for it in items:
@@ -1690,6 +2262,8 @@ def main(argv: Optional[List[str]] = None) -> None:
 
     # Commands that need scope
     scope = _load_scope(repo_root)
+    global _mmap_tiles
+    _mmap_tiles = bool((scope.effective.get("display") or {}).get("mmap_tiles", False))
 
     if cmd == "about":
         # about is informational, no packet
@@ -1725,6 +2299,9 @@ def main(argv: Optional[List[str]] = None) -> None:
     sort_key = _get_flag_value(args, "--sort") or ""
     meta = _pop_flag(args, "--meta")
     show_locs = _pop_flag(args, "--show-locs")
+    global _serial_tiles, _fresh_aggregates
+    _serial_tiles = _pop_flag(args, "--serial")
+    _fresh_aggregates = _pop_flag(args, "--fresh")
 
     # Use scope default limit if none provided
     lim = _maybe_int(limit, _default_limit_from_scope(scope))